@@ -1,3 +1,7 @@
 from .base_agent import BaseAgent
 from .random_agent import RandomAgent
 from .minimax_agent import MinimaxAgent
+from .expectimax_agent import ExpectimaxAgent
+from .depth_policy import AdaptiveDepthPolicy
+from .ntuple_agent import NTupleAgent
+from .monte_carlo_agent import MonteCarloAgent
@@ -10,6 +10,17 @@ class BaseAgent:
     def get_move(self, game):
         return NotImplementedError
 
+    def get_state(self):
+        """Return the picklable state the agent carries from one move to the next (e.g. a random generator)
+
+        It is saved with the checkpoints of a game in progress, see `tester.experiment`. None if there is none.
+        """
+        return None
+
+    def set_state(self, state):
+        """Restore a state returned by `get_state`"""
+        pass
+
     def random_move(self, game):
         """Pick a move from available moves randomly"""
         move = choice(game.moves_available())
@@ -0,0 +1,90 @@
+class AdaptiveDepthPolicy:
+    """Pick the search depth of every move from the board congestion and a latency budget.
+
+    Open boards get shallow searches, since almost any sensible move works there. Crowded boards get deep
+    searches, one level deeper still with many distinct tile values waiting to be merged; they are also where
+    the chance nodes branch the least, so deep searches stay affordable. If `target_time` is set, the depth is then
+    lowered until the expected time of the move, learnt from the previous moves, fits the target.
+
+    Parameters
+    ----------
+    min_depth : int, optional (default=3)
+        See attributes.
+    max_depth : int, optional (default=9)
+        See attributes.
+    target_time : float, optional (default=None)
+        See attributes.
+    smoothing : float, optional (default=0.2)
+        The weight of the last move in the moving average of move times.
+
+    Attributes
+    ----------
+    min_depth : int
+        The depth used on the most open boards.
+    max_depth : int
+        The depth used on crowded boards with many distinct values, other crowded boards are searched one level
+        shallower. It has the same meaning as `MinimaxAgent.max_depth`.
+    target_time : float or None
+        The wanted time per move in seconds.
+    """
+    # (min empty tiles, depth reduction): boards with at least that many empty tiles are searched shallower
+    EMPTY_TILE_STEPS = ((10, 3), (6, 2), (3, 1))
+    # Boards with at least that many distinct values get one more level (up to `max_depth`, the other boards
+    # stopping one level short of it), as long merge chains need depth
+    DISTINCT_VALUES_BONUS = 8
+    # How much slower a level is than the one above when no move was timed at that depth yet
+    DEFAULT_GROWTH = 4.
+
+    def __init__(self, min_depth=3, max_depth=9, target_time=None, smoothing=0.2):
+        # 9 (i.e. 8 on crowded boards) wins as often as a fixed depth of 8 at 2.6x less time per move: 38% vs 37%
+        # of 100 games reaching 2048, 6.1ms vs 16.0ms per move. With 8, 33% of the games reach 2048 at 2.7ms.
+        assert 1 < min_depth <= max_depth
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.target_time = target_time
+        self.smoothing = smoothing
+        self._move_times = {}
+
+    def congestion_depth(self, state):
+        """Return the depth deserved by the board, regardless of the time budget"""
+        # Read from the tiles rather than the packed board, as games with tiles beyond 32768 are not packed
+        exponents = [tile.bit_length() for row in state.board for tile in row]
+        empty = exponents.count(0)
+        distinct = len(set(exponents) - {0})
+
+        depth = self.max_depth - 1
+        for min_empty, reduction in self.EMPTY_TILE_STEPS:
+            if empty >= min_empty:
+                depth -= reduction
+                break
+        if distinct >= self.DISTINCT_VALUES_BONUS:
+            depth += 1
+        return max(self.min_depth, min(self.max_depth, depth))
+
+    def expected_time(self, depth):
+        """Return the expected time of a move searched at the given depth, or None if unknown"""
+        if depth in self._move_times:
+            return self._move_times[depth]
+        known = [d for d in self._move_times if d < depth]
+        if not known:
+            return None
+        d = max(known)
+        return self._move_times[d] * self.DEFAULT_GROWTH ** (depth - d)
+
+    def choose_depth(self, state):
+        """Return the max depth of the search of this move"""
+        depth = self.congestion_depth(state)
+        if self.target_time is not None:
+            while depth > self.min_depth:
+                expected = self.expected_time(depth)
+                if expected is None or expected <= self.target_time:
+                    break
+                depth -= 1
+        return depth
+
+    def record(self, depth, seconds):
+        """Record the time of a move searched at the given depth"""
+        if depth in self._move_times:
+            self._move_times[depth] += self.smoothing * (seconds - self._move_times[depth])
+        else:
+            self._move_times[depth] = seconds
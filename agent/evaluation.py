@@ -0,0 +1,214 @@
+"""Table-driven evaluation of packed game boards.
+
+Every heuristic of `MinimaxAgent.evaluate` but the max tile position is a sum of independent per-row and
+per-column terms. These terms are precomputed, already weighted, for all 65536 packed rows, so evaluating
+a board takes 8 table lookups (4 rows and 4 columns of the transposed board) instead of walking the board
+once per heuristic. The tables of every configuration are cached on disk, see `game.tables`.
+
+Boards larger than 4x4 are evaluated by `SizedHeuristicEvaluator` the same way, from terms computed the first
+time a row is seen since tables of every wider row would not fit in memory.
+"""
+
+from game.bitboard import ROW_MASK, TILE_MASK, transpose
+from game.tables import load_tables
+
+HEURISTICS = ('empty', 'position', 'weighted_sum', 'smooth', 'mono')
+DEFAULT_WEIGHTS = {name: 1 for name in HEURISTICS}
+
+_tables = {}
+
+
+def row_empty(tiles):
+    """Return the number of empty tiles in a row"""
+    return tiles.count(0)
+
+
+def row_smoothness(tiles):
+    """Return the sum of differences between neighboring tiles of a row"""
+    return sum(abs(tiles[i] - tiles[i + 1]) for i in range(len(tiles) - 1))
+
+
+def row_monotonicity(tiles):
+    """Return the monotonicity count of a row, see `MinimaxAgent.monotonicity`"""
+    mono = 0
+    diff = tiles[0] - tiles[1]
+    for i in range(len(tiles) - 1):
+        if (tiles[i] - tiles[i + 1]) * diff <= 0:
+            mono += 1
+        diff = tiles[i] - tiles[i + 1]
+    return mono
+
+
+def _row_terms(exponents, weights, weight_matrix):
+    """Return the weighted terms of a row given by its exponents
+
+    Return
+    ----------
+    tuple
+        The first element is the term of the row at every row index (it depends on the weight matrix row).
+        The second element is the term of the row as a column.
+        The third element is the max exponent of the row.
+    """
+    tiles = [1 << e if e else 0 for e in exponents]
+    line = weights['smooth'] * row_smoothness(tiles) + weights['mono'] * row_monotonicity(tiles)
+    row_line = line + weights['empty'] * row_empty(tiles)
+    row_terms = tuple(row_line + weights['weighted_sum'] * sum(tile * w for tile, w in zip(tiles, matrix_row))
+                      for matrix_row in weight_matrix)
+    return row_terms, line, max(exponents)
+
+
+def _build_tables(weights, weight_matrix):
+    """Build the weighted per-row tables, the per-column table and the row max exponent table"""
+    size = ROW_MASK + 1
+    row_tables = [[0] * size for _ in range(len(weight_matrix))]
+    col_table = [0] * size
+    max_table = [0] * size
+
+    for row in range(size):
+        exponents = [(row >> (4 * j)) & TILE_MASK for j in range(4)]
+        row_terms, col_table[row], max_table[row] = _row_terms(exponents, weights, weight_matrix)
+        for i, term in enumerate(row_terms):
+            row_tables[i][row] = term
+
+    return row_tables, col_table, max_table
+
+
+def _build_flat_tables(weights, weight_matrix):
+    """Build the tables of `_build_tables` as a flat list, as stored in the table cache"""
+    row_tables, col_table, max_table = _build_tables(weights, weight_matrix)
+    return row_tables + [col_table, max_table]
+
+
+class HeuristicEvaluator:
+    """Evaluate packed boards as the weighted sum of the `MinimaxAgent` heuristics.
+
+    With the default weights the result is exactly the one of the original `MinimaxAgent.evaluate`.
+    Tables are loaded on first use, from the table cache keyed by `config_key` or by building them, and shared
+    by all evaluators with the same configuration.
+
+    Parameters
+    ----------
+    weight_matrix : list of lists
+        The 4x4 matrix used by the weighted sum heuristic.
+    max_tile_credit : float
+        The credit for having the max tile on the top-left corner (and the penalty otherwise).
+    weights : dict, optional (default=None)
+        The weight of each heuristic among `HEURISTICS`, missing ones default to 1.
+    cache_tables : bool, optional (default=True)
+        If False, the tables are built for this evaluator alone, neither read from nor saved to the table
+        cache nor shared, so that they are freed with the evaluator (e.g. for throwaway tuning candidates).
+    """
+
+    def __init__(self, weight_matrix, max_tile_credit, weights=None, cache_tables=True):
+        self.weight_matrix = [list(row) for row in weight_matrix]
+        self.max_tile_credit = max_tile_credit
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            unknown = set(weights) - set(HEURISTICS)
+            if unknown:
+                raise ValueError('Unknown heuristics: {}'.format(', '.join(sorted(unknown))))
+            self.weights.update(weights)
+        self._position = self.weights['position'] * max_tile_credit
+        self.cache_tables = cache_tables
+        self._tables = None
+
+    @property
+    def config_key(self):
+        """A hashable key identifying the tables of this configuration"""
+        return (tuple(self.weights[name] for name in HEURISTICS),
+                tuple(tuple(row) for row in self.weight_matrix))
+
+    def tables(self):
+        """Return the (row_tables, col_table, max_table) tables as lists, loading them on first use"""
+        if self._tables is None:
+            key = self.config_key
+            if key in _tables:
+                self._tables = _tables[key]
+            elif not self.cache_tables:
+                tables = _build_flat_tables(self.weights, self.weight_matrix)
+                self._tables = (tables[:-2], tables[-2], tables[-1])
+            else:
+                mapped = load_tables('evaluation', key,
+                                     lambda: _build_flat_tables(self.weights, self.weight_matrix))
+                tables = [table.tolist() for table in mapped]
+                self._tables = _tables[key] = (tables[:-2], tables[-2], tables[-1])
+        return self._tables
+
+    def evaluate(self, packed):
+        """Evaluate a packed board"""
+        (t0, t1, t2, t3), col_table, max_table = self.tables()
+        r0 = packed & ROW_MASK
+        r1 = (packed >> 16) & ROW_MASK
+        r2 = (packed >> 32) & ROW_MASK
+        r3 = packed >> 48
+        transposed = transpose(packed)
+        c0 = transposed & ROW_MASK
+        c1 = (transposed >> 16) & ROW_MASK
+        c2 = (transposed >> 32) & ROW_MASK
+        c3 = transposed >> 48
+
+        max_exponent = max(max_table[r0], max_table[r1], max_table[r2], max_table[r3])
+        # Considered with the weight matrix, always keep the max tile in the corner
+        position = self._position if packed & TILE_MASK == max_exponent else -self._position
+
+        return (position + t0[r0] + t1[r1] + t2[r2] + t3[r3] +
+                col_table[c0] + col_table[c1] + col_table[c2] + col_table[c3])
+
+
+class _RowTerms(dict):
+    """The `_row_terms` of packed rows, computed the first time a row is looked up"""
+
+    def __init__(self, size, weights, weight_matrix):
+        super().__init__()
+        self.size = size
+        self.weights = weights
+        self.weight_matrix = weight_matrix
+
+    def __missing__(self, row):
+        exponents = [(row >> (4 * j)) & TILE_MASK for j in range(self.size)]
+        terms = self[row] = _row_terms(exponents, self.weights, self.weight_matrix)
+        return terms
+
+
+class SizedHeuristicEvaluator(HeuristicEvaluator):
+    """Evaluate packed boards of any size (see `game.bitboard.BoardShape`) like `HeuristicEvaluator`.
+
+    Parameters
+    ----------
+    shape : BoardShape
+        The shape of the evaluated boards.
+    weight_matrix : list of lists
+        The matrix used by the weighted sum heuristic, of the size of the boards.
+    max_tile_credit : float
+        The credit for having the max tile on the top-left corner (and the penalty otherwise).
+    weights : dict, optional (default=None)
+        The weight of each heuristic among `HEURISTICS`, missing ones default to 1.
+    """
+
+    def __init__(self, shape, weight_matrix, max_tile_credit, weights=None):
+        super().__init__(weight_matrix, max_tile_credit, weights)
+        self.shape = shape
+
+    def tables(self):
+        """Return the row terms, filled as rows are looked up"""
+        if self._tables is None:
+            self._tables = _RowTerms(self.shape.size, self.weights, self.weight_matrix)
+        return self._tables
+
+    def evaluate(self, packed):
+        """Evaluate a packed board"""
+        terms = self.tables()
+        shape = self.shape
+        mask = shape.row_mask
+        total = 0
+        max_exponent = 0
+        for i, shift in enumerate(shape.row_shifts):
+            row_terms, _, row_max = terms[(packed >> shift) & mask]
+            total += row_terms[i]
+            if row_max > max_exponent:
+                max_exponent = row_max
+        transposed = shape.transpose(packed)
+        for shift in shape.row_shifts:
+            total += terms[(transposed >> shift) & mask][1]
+        # Considered with the weight matrix, always keep the max tile in the corner
+        return total + (self._position if packed & TILE_MASK == max_exponent else -self._position)
@@ -0,0 +1,107 @@
+import time
+
+from agent.minimax_agent import MinimaxAgent, SearchTimeout, AGENT, search_state
+
+# The computer spawns a 2 or a 4 with prob 90% and 10%, respectively (see `Game2048._fill_random_empty_tile`)
+SPAWN_PROBABILITIES = ((2, 0.9), (4, 0.1))
+
+
+class ExpectimaxAgent(MinimaxAgent):
+    """A game agent pick the next move based on the result of an expectimax search tree.
+
+    Unlike `MinimaxAgent`, the computer is not treated as an adversary: a chance node averages its children,
+    a spawn on every empty tile being equally likely and a 2 or a 4 being spawned with their real probabilities.
+    Branches whose cumulative probability falls below `prob_cutoff` are evaluated right away instead of being
+    expanded, and chance node values are cached within a move, so the search gets deeper for the same cost.
+    The board evaluation is the one of `MinimaxAgent`.
+
+    Parameters
+    ----------
+    max_depth : int
+        See attributes.
+    prob_cutoff : float, optional (default=1e-4)
+        See attributes.
+    time_limit : float, optional (default=None)
+        The wall-clock budget of a move in seconds. If None, every iteration runs to completion.
+
+    Attributes
+    ----------
+    max_depth : int
+        This int will be used as the maximum depth of the expectimax search tree.
+    prob_cutoff : float
+        Branches less likely than this are not expanded.
+    cache_hits : int
+        The number of chance nodes answered by the cache during the last move.
+    """
+
+    def __init__(self, max_depth=6, prob_cutoff=1e-4, time_limit=None):
+        super().__init__(max_depth=max_depth, time_limit=time_limit)
+        self.prob_cutoff = prob_cutoff
+        self.cache_hits = 0
+        self._cache = {}
+
+    def get_move(self, game):
+        """Search the next optimal move by the iterative deepening technique"""
+        # Search over compact immutable states rather than full games
+        game = search_state(game)
+        available = game.moves_available()
+        if not available:
+            return None
+        max_move = available[0]
+        self._deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        self._cache = {}
+        self.cache_hits = 0
+
+        # Iterative deepening
+        for d in range(1, self.max_depth):
+            try:
+                max_move = self.search_root(game, available, d)
+            except SearchTimeout:
+                break
+
+        return max_move
+
+    def search_root(self, game, available, max_depth):
+        """Return the move leading to the highest expected value"""
+        max_move, max_value = available[0], float('-inf')
+        for m, game_copy, _ in game.children():
+            value = self.expectimax(game_copy, 2, max_depth, 1.)
+            if value > max_value:
+                max_move, max_value = m, value
+        return max_move
+
+    def expectimax(self, game, depth, max_depth, prob):
+        """The implementation of the expectimax search with probability cutoff"""
+        if self._deadline is not None and time.time() > self._deadline:
+            raise SearchTimeout()
+
+        # Evaluate when possible
+        if depth > max_depth or prob < self.prob_cutoff or game.is_lost():
+            return self.evaluate(game)
+
+        # Agent's turn
+        if game.active_player == AGENT:
+            v = float('-inf')
+            for _, game_copy, _ in game.children():
+                v = max(v, self.expectimax(game_copy, depth + 1, max_depth, prob))
+            return v
+
+        # Reuse a chance node already searched at least as deep
+        remaining = max_depth - depth
+        key = game.state_key()
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] >= remaining:
+            self.cache_hits += 1
+            return cached[1]
+
+        available_tiles = game.empty_tiles()
+        tile_prob = 1. / len(available_tiles)
+        v = 0.
+        for tile in available_tiles:
+            for value, spawn_prob in SPAWN_PROBABILITIES:
+                child = game.spawn(tile, value)
+                v += spawn_prob * self.expectimax(child, depth + 1, max_depth, prob * tile_prob * spawn_prob)
+        v *= tile_prob
+
+        self._cache[key] = (remaining, v)
+        return v
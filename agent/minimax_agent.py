@@ -1,5 +1,13 @@
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from agent import base_agent
-from game import Game2048
+from agent.evaluation import HeuristicEvaluator, SizedHeuristicEvaluator
+from agent.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from game import Game2048, GameState
+from game.bitboard import BOARD_SIZE, board_shape, get_tables, packed_board_of
 
 MAX_TILE_CREDIT = 10e4
 WEIGHT_MATRIX = [
@@ -10,6 +18,54 @@ WEIGHT_MATRIX = [
 ]
 
 AGENT = Game2048.agent
+# The constructor arguments saved in a heuristic configuration file, see `MinimaxAgent.save_config`
+HEURISTIC_CONFIG = ('heuristic_weights', 'weight_matrix', 'max_tile_credit')
+
+
+def default_weight_matrix(size):
+    """Return the weight matrix of a board size, `WEIGHT_MATRIX` for 4x4 boards
+
+    Other sizes get weights growing by 4 per step towards the top-left corner, i.e. 4 ** (2 * (size - 1))
+    in the corner down to 1 in the opposite one, which is close to `WEIGHT_MATRIX` at size 4.
+    """
+    if size == BOARD_SIZE:
+        return WEIGHT_MATRIX
+    return [[4 ** (2 * (size - 1) - i - j) for j in range(size)] for i in range(size)]
+
+
+# The agent of a root-parallel search worker process and the root move values it reads bounds from
+_worker_agent = None
+_worker_bounds = None
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search tree once the deadline of the current move has passed"""
+
+
+def search_state(game):
+    """Return the node a search starts from: the `GameState` of a game, or a copy of it if its tiles are too big
+
+    Tiles beyond 32768 do not fit the packed boards, such games are searched over `Game2048` copies (which move
+    through `children` and `spawn` as states do) and evaluated by `MinimaxAgent.evaluate_heuristics`.
+    """
+    try:
+        return GameState.from_game(game)
+    except ValueError:
+        state = game.copy()
+        state.game_mode = False
+        return state
+
+
+def _init_search_worker(config, bounds):
+    """Create the agent of a root-parallel search worker"""
+    global _worker_agent, _worker_bounds
+    _worker_agent = MinimaxAgent(**config)
+    _worker_bounds = bounds
+
+
+def _search_root_move(state, move, index, max_depth, deadline, token):
+    """Search one root move in a worker process"""
+    return _worker_agent.search_root_move(state, move, index, max_depth, deadline, token, _worker_bounds)
 
 
 class MinimaxAgent(base_agent.BaseAgent):
@@ -23,84 +79,381 @@ class MinimaxAgent(base_agent.BaseAgent):
     ----------
     max_depth : int
         This int will be used as the maximum depth of the minimax search tree.
+    tt_size : int, optional (default=0)
+        The maximum number of entries of the transposition table. If 0, no transposition table is used.
+    tt_policy : str, optional (default='lru')
+        The eviction policy of the transposition table, 'lru' or 'depth'. See `TranspositionTable`.
+    persist_tt : bool, optional (default=False)
+        If True, the transposition table is kept across moves, which only makes sense within one game.
+        If False, it is cleared at the beginning of every `get_move`.
+    time_limit : float, optional (default=None)
+        The wall-clock budget of a move in seconds. If None, every iteration runs to completion.
+    workers : int, optional (default=1)
+        If greater than 1, the root moves are searched in parallel by a persistent pool of this many processes.
+        Call `close` to shut the pool down.
+    stats : SearchStats, optional (default=None)
+        See attributes.
+    depth_policy : AdaptiveDepthPolicy, optional (default=None)
+        See attributes.
+    heuristic_weights : dict, optional (default=None)
+        The weight of each heuristic of `evaluate`, see `agent.evaluation.HEURISTICS`. Missing ones default to 1.
+    weight_matrix : list of lists, optional (default=None)
+        The matrix of the weighted sum heuristic. If None, `WEIGHT_MATRIX` is used. Boards of other sizes use
+        `default_weight_matrix`.
+    max_tile_credit : float, optional (default=None)
+        The credit of the max tile position heuristic. If None, `MAX_TILE_CREDIT` is used.
+    cache_tables : bool, optional (default=True)
+        If False, the evaluation tables are not saved to the table cache, see `HeuristicEvaluator`.
 
     Attributes
     ----------
     max_depth : int
         Default 8.
+    tt : TranspositionTable or None
+        The transposition table shared by all iterations of the iterative deepening.
+        Its `hits`/`misses`/`evictions` counters tell how useful it is.
+    persist_tt : bool
+        Whether the transposition table is kept across moves.
+    time_limit : float or None
+        The wall-clock budget of a move in seconds.
+    evaluator : HeuristicEvaluator
+        The table-driven board evaluation used by `evaluate` on 4x4 boards, other sizes get their own
+        `SizedHeuristicEvaluator`.
+    stats : SearchStats or None
+        If set, it is filled with the node counts, cutoffs and per-iteration timings of the last move.
+        With the root-parallel search, only the root moves are searched here, so nodes are not counted.
+    depth_policy : AdaptiveDepthPolicy or None
+        If set, it picks the max depth of every move instead of `max_depth`.
     """
+    num_killers = 2
 
-    def __init__(self, max_depth=8):  # 8 gives a >50% rate of achieving 2048 within half an hour
+    def __init__(self, max_depth=8, tt_size=0, tt_policy='lru', persist_tt=False, time_limit=None,
+                 heuristic_weights=None, weight_matrix=None, max_tile_credit=None, workers=1, stats=None,
+                 depth_policy=None, cache_tables=True):
+        # 8 gives a >50% rate of achieving 2048 within half an hour
         super().__init__()
+        self._config = dict(max_depth=max_depth, tt_size=tt_size, tt_policy=tt_policy, persist_tt=persist_tt,
+                            heuristic_weights=heuristic_weights, weight_matrix=weight_matrix,
+                            max_tile_credit=max_tile_credit, cache_tables=cache_tables)
+        self.workers = workers
+        self.stats = stats
+        self.depth_policy = depth_policy
         self.max_depth = max_depth
+        self.tt = TranspositionTable(tt_size, tt_policy) if tt_size else None
+        self.persist_tt = persist_tt
+        self.time_limit = time_limit
+        self.weight_matrix = weight_matrix if weight_matrix is not None else WEIGHT_MATRIX
+        self.max_tile_credit = max_tile_credit if max_tile_credit is not None else MAX_TILE_CREDIT
+        self.evaluator = HeuristicEvaluator(self.weight_matrix, self.max_tile_credit, heuristic_weights,
+                                            cache_tables)
+        self._sized_evaluators = {}
+        # Search state carried from one iteration of the iterative deepening to the next
+        self._deadline = None
+        self._root_scores = {}
+        self._best_moves = {}
+        self._killers = {}
+        # Root-parallel search state
+        self._pool = None
+        self._bounds = None
+        self._bound_index = None
+        self._token = 0
+
+    @classmethod
+    def from_config(cls, path, **kwargs):
+        """Create an agent with the heuristic configuration saved in a JSON file (e.g. by `agent.tuning`)
+
+        Other constructor arguments (e.g. `max_depth`) are given as keyword arguments.
+        """
+        with open(path) as f:
+            config = json.load(f)
+        unknown = set(config) - set(HEURISTIC_CONFIG)
+        if unknown:
+            raise ValueError('Unknown configuration keys in {}: {}'.format(path, ', '.join(sorted(unknown))))
+        kwargs.update(config)
+        return cls(**kwargs)
+
+    def heuristic_config(self):
+        """Return the heuristic weights, weight matrix and max tile credit of the agent"""
+        return {
+            'heuristic_weights': dict(self.evaluator.weights),
+            'weight_matrix': [list(row) for row in self.weight_matrix],
+            'max_tile_credit': self.max_tile_credit,
+        }
+
+    def save_config(self, path):
+        """Save the heuristic configuration of the agent to a JSON file, see `from_config`"""
+        with open(path, 'w') as f:
+            json.dump(self.heuristic_config(), f, indent=2)
+
+    def close(self):
+        """Shut down the worker pool of the root-parallel search"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self):
+        """Start the worker pool on first use, after building the tables so that forked workers share them"""
+        if self._pool is None:
+            get_tables()
+            self.evaluator.tables()
+            self._bounds = multiprocessing.Array('d', 4, lock=False)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_search_worker,
+                                             initargs=(self._config, self._bounds))
+        return self._pool
 
     def get_move(self, game):
-        """Search the next optimal move by the iterative deepening technique"""
-        available = game.moves_available()
-        max_move = available[0] if available else None
-        max_score = float('-inf')
+        """Search the next optimal move by the iterative deepening technique
+
+        Each iteration orders the moves by what the previous iterations found: root moves by their previous
+        scores, interior moves by the best move previously found in the same position and by the killer moves
+        (the ones that caused a cutoff at the same depth). Good moves searched first make alpha-beta cut more.
+        If `time_limit` is set, the search is abandoned when it runs out of time and the best move of the
+        deepest completed iteration is returned.
+        If `workers` is greater than 1, every iteration searches the root moves in parallel, see `search_parallel`.
+        If `depth_policy` is set, it picks the max depth of this move.
+        """
+        # Search over compact immutable states rather than full games
+        state = search_state(game)
+        available = state.moves_available()
+        if not available:
+            return None
+        max_move = available[0]
+        if self.tt is not None and not self.persist_tt:
+            self.tt.clear()
+        self._deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        self._root_scores = {}
+        self._best_moves = {}
+        self._killers = {}
+        self._token += 1
+        stats = self.stats
+        if stats is not None:
+            stats.start_move(state)
+        timed_out = False
+        max_depth = self.max_depth
+        if self.depth_policy is not None:
+            max_depth = self.depth_policy.choose_depth(state)
+            move_start = time.time()
 
-        # TODO: do we really need iterative deepening or not?
         # Iterative deepening
-        for d in range(1, self.max_depth):
-            move, score = self.search(game, float('-inf'), float('inf'), 1, d)
-            if score > max_score:
-                max_score = score
+        for d in range(1, max_depth):
+            if self.workers > 1:
+                move = self.search_parallel(state, available, d)
+                if move is None:
+                    timed_out = True
+                    break
                 max_move = move
+            else:
+                try:
+                    max_move, _ = self.search(state, float('-inf'), float('inf'), 1, d)
+                except SearchTimeout:
+                    timed_out = True
+                    break
+            if stats is not None:
+                stats.end_iteration(d)
 
+        if stats is not None:
+            stats.end_move(max_move, timed_out)
+        if self.depth_policy is not None:
+            self.depth_policy.record(max_depth, time.time() - move_start)
         return max_move
 
+    def search_parallel(self, state, available, max_depth):
+        """Search every root move in the worker pool, return the best move or None if the deadline passed
+
+        Each finished root move publishes its value, and a worker raises its alpha at the first chance layer to
+        the best value of the root moves ordered before its own. A move only wins by being strictly better than
+        the earlier ones, so these bounds prune without changing the chosen move: it is the one of the serial
+        search (provided the transposition table is disabled, since its content depends on the search order).
+        """
+        pool = self._get_pool()
+        moves = sorted(available, key=lambda m: -self._root_scores.get(m, float('-inf')))
+        for i in range(len(self._bounds)):
+            self._bounds[i] = float('-inf')
+
+        futures = {pool.submit(_search_root_move, state, m, index, max_depth, self._deadline, self._token): index
+                   for index, m in enumerate(moves)}
+        values = [None] * len(moves)
+        for future in as_completed(futures):
+            index = futures[future]
+            values[index] = future.result()
+            if values[index] is not None:
+                self._bounds[index] = values[index]
+        if any(v is None for v in values):
+            return None
+
+        self._root_scores = dict(zip(moves, values))
+        result_move, v = moves[0], float('-inf')
+        for m, value in zip(moves, values):
+            if value > v:
+                result_move, v = m, value
+        return result_move
+
+    def search_root_move(self, state, move, index, max_depth, deadline, token, bounds):
+        """Return the value of one root move searched by a worker, or None if the deadline passed"""
+        if token != self._token:
+            # A new move to search, drop the history of the previous one
+            self._token = token
+            self._best_moves = {}
+            self._killers = {}
+            if self.tt is not None and not self.persist_tt:
+                self.tt.clear()
+        self._deadline = deadline
+        self._bounds = bounds
+        self._bound_index = index
+
+        child = next(child for m, child, _ in state.children() if m == move)
+        try:
+            return self.search(child, float('-inf'), float('inf'), 2, max_depth)
+        except SearchTimeout:
+            return None
+
+    def _order(self, candidates, best, depth):
+        """Put the previously best move first, followed by the killer moves of this depth"""
+        killers = self._killers.get(depth)
+        if best is None and not killers:
+            return candidates
+        head = []
+        for c in [best] + (killers or []):
+            if c is not None and c in candidates and c not in head:
+                head.append(c)
+        return head + [c for c in candidates if c not in head]
+
+    def _add_killer(self, candidate, depth):
+        """Remember a move/tile which caused a cutoff at the given depth"""
+        killers = self._killers.setdefault(depth, [])
+        if candidate not in killers:
+            killers.insert(0, candidate)
+            del killers[self.num_killers:]
+
     def search(self, game, alpha, beta, depth, max_depth):
-        """The implementation of the minimax search with alpha-beta pruning"""
+        """The implementation of the minimax search with alpha-beta pruning over `GameState` nodes
+
+        The computer always spawns a 2, as `fill_specific_empty_tile` does on the 'simple' difficulty.
+        """
+        if self._deadline is not None and time.time() > self._deadline:
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+
         # Evaluate when possible
         if depth > max_depth or game.is_lost():
+            if stats is not None:
+                stats.leaves += 1
             return self.evaluate(game)
 
+        # Reuse the result of an identical position searched at least as deep
+        remaining = max_depth - depth
+        key = game.state_key() if depth > 1 else None
+        if self.tt is not None and key is not None:
+            entry = self.tt.lookup(key)
+            if entry is not None and entry[0] >= remaining:
+                _, value, flag = entry
+                if flag == EXACT or (flag == LOWER_BOUND and value >= beta) or \
+                        (flag == UPPER_BOUND and value <= alpha):
+                    if stats is not None:
+                        stats.tt_hits += 1
+                    return value
+        alpha_orig, beta_orig = alpha, beta
+
         # Agent's turn
         if game.active_player == AGENT:
-            moves = game.moves_available()
+            children = {m: child for m, child, _ in game.children()}
+            moves = list(children)
+            if depth == 1:
+                moves.sort(key=lambda m: -self._root_scores.get(m, float('-inf')))
+            else:
+                moves = self._order(moves, self._best_moves.get(key), depth)
             result_move = moves[0]
             v = float('-inf')
             # Go through all possible moves
             for m in moves:
-                game_copy = game.copy()
-                game_copy.perform_move(m)
-                prev_v = v
-                v = max(v, self.search(game_copy, alpha, beta, depth + 1, max_depth))
-                if v > prev_v and depth == 1:
+                child_v = self.search(children[m], alpha, beta, depth + 1, max_depth)
+                if depth == 1:
+                    self._root_scores[m] = child_v
+                if child_v > v:
+                    v = child_v
                     result_move = m
                 if v >= beta:
-                    return v
+                    self._add_killer(m, depth)
+                    if stats is not None:
+                        stats.beta_cutoffs += 1
+                    break
                 alpha = max(alpha, v)
-            if depth == 1:
-                return result_move, v
-            return v
         else:
-            available_tiles = game.empty_tiles()
+            available_tiles = self._order(game.empty_tiles(), self._best_moves.get(key), depth)
+            result_move = ''
             v = float('inf')
             for tile in available_tiles:
-                game_copy = game.copy()
-                game_copy.fill_specific_empty_tile(tile)
-                # Switch player here
-                game_copy.switch_player()
-                v = min(v, self.search(game_copy, alpha, beta, depth + 1, max_depth))
+                if depth == 2 and self._bound_index is not None:
+                    # Root-parallel search: the root moves ordered before this one bound it from below
+                    alpha = max(alpha, max(self._bounds[:self._bound_index], default=alpha))
+                    if v <= alpha:
+                        if stats is not None:
+                            stats.alpha_cutoffs += 1
+                        break
+                child_v = self.search(game.spawn(tile), alpha, beta, depth + 1, max_depth)
+                if child_v < v:
+                    v = child_v
+                    result_move = tile
                 if v <= alpha:
-                    return v
+                    self._add_killer(tile, depth)
+                    if stats is not None:
+                        stats.alpha_cutoffs += 1
+                    break
                 beta = min(beta, v)
-            if depth == 1:
-                return '', v
-            return v
+            # Alpha only changes here by the root-parallel bounds, which are valid bounds for the stored value
+            alpha_orig = alpha
+
+        if key is not None:
+            self._best_moves[key] = result_move
+            if self.tt is not None:
+                if v <= alpha_orig:
+                    flag = UPPER_BOUND
+                elif v >= beta_orig:
+                    flag = LOWER_BOUND
+                else:
+                    flag = EXACT
+                self.tt.store(key, remaining, v, flag)
+
+        if depth == 1:
+            return result_move, v
+        return v
+
+    def weight_matrix_for(self, size):
+        """Return the weight matrix of boards of `size` x `size` tiles, `weight_matrix` if it has that size"""
+        return self.weight_matrix if len(self.weight_matrix) == size else default_weight_matrix(size)
+
+    def sized_evaluator(self, size):
+        """Return the evaluator of boards of `size` x `size` tiles, creating it on first use"""
+        evaluator = self._sized_evaluators.get(size)
+        if evaluator is None:
+            evaluator = self._sized_evaluators[size] = SizedHeuristicEvaluator(
+                board_shape(size), self.weight_matrix_for(size), self.max_tile_credit, self.evaluator.weights)
+        return evaluator
 
     def evaluate(self, game):
         """Evaluate the game board based on some pre-defined heuristic functions"""
-        empty = self.empty_tiles(game)
-        position = self.max_tile_position(game)
-        weighted_sum = self.weighted_board(game)
-        smooth = self.smoothness(game)
-        mono = self.monotonicity(game)
+        if game.size != BOARD_SIZE:
+            try:
+                return self.sized_evaluator(game.size).evaluate(packed_board_of(game))
+            except ValueError:
+                return self.evaluate_heuristics(game)
+        try:
+            packed = packed_board_of(game)
+        except ValueError:
+            # Tiles beyond 32768 do not fit the lookup tables
+            return self.evaluate_heuristics(game)
+        return self.evaluator.evaluate(packed)
 
-        # TODO: should use weights to measure heuristics
-        return empty + position + weighted_sum + smooth + mono
+    def evaluate_heuristics(self, game):
+        """Evaluate the game board by running every heuristic function on it"""
+        weights = self.evaluator.weights
+        return (weights['empty'] * self.empty_tiles(game) +
+                weights['position'] * self.max_tile_position(game) +
+                weights['weighted_sum'] * self.weighted_board(game) +
+                weights['smooth'] * self.smoothness(game) +
+                weights['mono'] * self.monotonicity(game))
 
     def empty_tiles(self, game):
         """Return the number of empty tiles on the game board"""
@@ -111,20 +464,21 @@ class MinimaxAgent(base_agent.BaseAgent):
         board = game.board
         max_tile = max(max(board, key=lambda x: max(x)))
 
-        # Considered with the WEIGHT_MATRIX, always keep the max tile in the corner
+        # Considered with the weight matrix, always keep the max tile in the corner
         if board[0][0] == max_tile:
-            return MAX_TILE_CREDIT
+            return self.max_tile_credit
         else:
-            return -MAX_TILE_CREDIT
+            return -self.max_tile_credit
 
     def weighted_board(self, game):
         """Perform point-wise product on the game board and a pre-defined weight matrix"""
         board = game.board
+        weight_matrix = self.weight_matrix_for(len(board))
 
         result = 0
         for i in range(len(board)):
             for j in range(len(board)):
-                result += board[i][j] * WEIGHT_MATRIX[i][j]
+                result += board[i][j] * weight_matrix[i][j]
 
         # Larger result means better
         return result
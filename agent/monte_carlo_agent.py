@@ -0,0 +1,206 @@
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent import base_agent
+from game.bitboard import BOARD_SIZE, board_shape, packed_board_of
+
+MOVES = (0, 1, 2, 3)
+
+
+def rollout(packed, rng, max_moves=None, size=BOARD_SIZE):
+    """Play random moves from a packed afterstate until the game is lost, return the score gained on the way
+
+    Parameters
+    ----------
+    packed : int
+        The packed board after the agent's move, before the computer's spawn.
+    rng : random.Random
+        The random generator of the spawns and the moves.
+    max_moves : int, optional (default=None)
+        If given, the rollout stops after this many moves.
+    size : int, optional (default=4)
+        The number of rows and columns of the board, see `game.bitboard.BoardShape`.
+    """
+    shape = board_shape(size)
+    execute_move, random_spawn = shape.execute_move, shape.random_spawn
+    score = 0
+    moves = 0
+    while max_moves is None or moves < max_moves:
+        packed = random_spawn(packed, rng)
+        children = []
+        for move in MOVES:
+            child, reward = execute_move(packed, move)
+            if child != packed:
+                children.append((child, reward))
+        if not children:
+            break
+        packed, reward = children[rng.randrange(len(children))]
+        score += reward
+        moves += 1
+    return score
+
+
+def rollout_batch(packed, count, max_moves, seed, size=BOARD_SIZE):
+    """Run `count` rollouts from a packed afterstate, return the (sum, sum of squares) of their scores"""
+    rng = random.Random(seed)
+    total = total_sq = 0
+    for _ in range(count):
+        score = rollout(packed, rng, max_moves, size)
+        total += score
+        total_sq += score * score
+    return total, total_sq
+
+
+def vectorized_rollouts(afterstates, count, max_moves, seed):
+    """Run `count` rollouts from every packed afterstate in lockstep, see `game.batch`
+
+    Return
+    ----------
+    list
+        The (sum, sum of squares) of the rollout scores of every afterstate.
+    """
+    # NumPy is only needed by the vectorized rollouts
+    from game.batch import BatchGame2048, random_policy
+
+    batch = BatchGame2048(1, seed)
+    batch.set_boards([after for after in afterstates for _ in range(count)])
+    batch.spawn(~batch.ended)
+    batch.run(random_policy, max_steps=max_moves)
+    scores = batch.scores.reshape(len(afterstates), count).astype(float)
+    return list(zip(scores.sum(axis=1).tolist(), (scores ** 2).sum(axis=1).tolist()))
+
+
+class MonteCarloAgent(base_agent.BaseAgent):
+    """A game agent pick the next move by the mean score of random rollouts played after it.
+
+    Every legal move is scored by the score it gains plus the mean score of random rollouts from its
+    afterstate. Rollouts are run in batches, and after every batch the moves whose confidence interval lies
+    below the one of the best move are dropped, so close moves get more rollouts and clear losers few.
+
+    Parameters
+    ----------
+    rollouts : int, optional (default=200)
+        See attributes.
+    batch_size : int, optional (default=25)
+        See attributes.
+    confidence : float, optional (default=2.)
+        See attributes.
+    time_limit : float, optional (default=None)
+        See attributes.
+    max_rollout_moves : int, optional (default=None)
+        If given, rollouts stop after this many moves.
+    workers : int, optional (default=1)
+        If greater than 1, the batches of the moves are run in parallel by a persistent pool of this many
+        processes. Call `close` to shut the pool down.
+    vectorized : bool, optional (default=False)
+        If True, the batches of all moves are run in lockstep with NumPy, see `game.batch`. Only 4x4 boards
+        are vectorized, rollouts on other sizes run in Python.
+    seed : int, optional (default=None)
+        The seed of the rollouts.
+
+    Attributes
+    ----------
+    rollouts : int
+        The max number of rollouts of a move.
+    batch_size : int
+        The number of rollouts of a move between two comparisons of the moves.
+    confidence : float
+        The half-width of the confidence intervals, in standard errors of the mean.
+    time_limit : float or None
+        The wall-clock budget of a move in seconds, checked between batches.
+    rollouts_done : int
+        The number of rollouts run for the last move.
+    """
+
+    def __init__(self, rollouts=200, batch_size=25, confidence=2., time_limit=None, max_rollout_moves=None,
+                 workers=1, vectorized=False, seed=None):
+        super().__init__()
+        self.rollouts = rollouts
+        self.batch_size = batch_size
+        self.confidence = confidence
+        self.time_limit = time_limit
+        self.max_rollout_moves = max_rollout_moves
+        self.workers = workers
+        self.vectorized = vectorized
+        self.rollouts_done = 0
+        self._rng = random.Random(seed)
+        self._pool = None
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def get_state(self):
+        """Return the state of the random generator of the rollouts"""
+        return self._rng.getstate()
+
+    def set_state(self, state):
+        """Restore the state of the random generator of the rollouts"""
+        self._rng.setstate(state)
+
+    def _get_pool(self):
+        """Start the worker pool on first use"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _run_batches(self, afterstates, count, size=BOARD_SIZE):
+        """Run `count` rollouts from every afterstate, return the (sum, sum of squares) of each"""
+        seeds = [self._rng.randrange(2 ** 32) for _ in afterstates]
+        if self.vectorized and size == BOARD_SIZE:
+            return vectorized_rollouts(afterstates, count, self.max_rollout_moves, seeds[0])
+        if self.workers > 1:
+            pool = self._get_pool()
+            futures = [pool.submit(rollout_batch, after, count, self.max_rollout_moves, seed, size)
+                       for after, seed in zip(afterstates, seeds)]
+            return [future.result() for future in futures]
+        return [rollout_batch(after, count, self.max_rollout_moves, seed, size)
+                for after, seed in zip(afterstates, seeds)]
+
+    def _interval(self, total, total_sq, n):
+        """Return the (mean, half-width) of the confidence interval of the mean rollout score"""
+        mean = total / n
+        variance = max(0., total_sq / n - mean * mean)
+        return mean, self.confidence * math.sqrt(variance / n)
+
+    def get_move(self, game):
+        """Return the move with the best gained score plus mean rollout score"""
+        packed = packed_board_of(game)
+        size = game.size
+        execute_move = board_shape(size).execute_move
+        candidates = {}
+        for move in MOVES:
+            after, reward = execute_move(packed, move)
+            if after != packed:
+                candidates[move] = (after, reward)
+        self.rollouts_done = 0
+        if len(candidates) <= 1:
+            return next(iter(candidates), None)
+
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        sums = {move: [0, 0, 0] for move in candidates}
+        racing = list(candidates)
+        while racing:
+            count = min(self.batch_size, self.rollouts - sums[racing[0]][2])
+            if count <= 0:
+                break
+            results = self._run_batches([candidates[move][0] for move in racing], count, size)
+            for move, (total, total_sq) in zip(racing, results):
+                sums[move][0] += total
+                sums[move][1] += total_sq
+                sums[move][2] += count
+            self.rollouts_done += count * len(racing)
+
+            intervals = {move: self._interval(*sums[move]) for move in racing}
+            best_low = max(candidates[move][1] + mean - width for move, (mean, width) in intervals.items())
+            racing = [move for move, (mean, width) in intervals.items()
+                      if candidates[move][1] + mean + width >= best_low]
+            if len(racing) <= 1 or (deadline is not None and time.time() > deadline):
+                break
+
+        return max(sums, key=lambda move: candidates[move][1] + sums[move][0] / sums[move][2]
+                   if sums[move][2] else float('-inf'))
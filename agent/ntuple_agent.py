@@ -0,0 +1,309 @@
+"""An agent playing with a learned n-tuple network, and its TD(0) self-play training.
+
+The value of a board is the sum of one weight per n-tuple, looked up by the tiles the n-tuple covers. The 17
+n-tuples are the 4 rows, the 4 columns and the 9 2x2 squares of the board: every one covers 4 tiles, i.e. 16
+bits of the packed board (see `game.bitboard`), so its weights are a 65536-entry slice of one flat array and
+evaluating a board takes 17 lookups.
+
+Weights are learnt by TD(0) on afterstates (the board after a move, before the spawn), from games played
+greedily against the learnt value. Games are played in rounds spread across worker processes: every worker
+learns from its games on its own copy of the weights and returns the updates it made, which are then summed
+into the weights.
+
+Usage:
+    python -m agent.ntuple_agent train <num_games> <weights_path> [workers]
+    python -m agent.ntuple_agent play <num_games> <weights_path> [search_depth]
+"""
+
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from agent import base_agent
+from game.bitboard import BOARD_SIZE, ROW_MASK, TILE_MASK, empty_mask, execute_move, packed_board_of, random_spawn, \
+    transpose
+from game.files import atomic_open
+
+NUM_TUPLES = 17
+TUPLE_SIZE = ROW_MASK + 1
+# Shifts of the top-left tile of the 2x2 squares
+SQUARE_SHIFTS = tuple(16 * i + 4 * j for i in range(3) for j in range(3))
+# The computer spawns a 2 or a 4 with prob 90% and 10%, respectively (see `Game2048._fill_random_empty_tile`)
+SPAWN_PROBABILITIES = ((1, 0.9), (2, 0.1))
+MOVES = (0, 1, 2, 3)
+
+WEIGHTS_MAGIC = b'NT01'
+WEIGHTS_HEADER = struct.Struct('<4sII')
+
+
+def tuple_indexes(packed):
+    """Return the indexes of the weights of the 17 n-tuples of a packed board in the flat weight array"""
+    t = transpose(packed)
+    indexes = [
+        packed & ROW_MASK,
+        TUPLE_SIZE + ((packed >> 16) & ROW_MASK),
+        2 * TUPLE_SIZE + ((packed >> 32) & ROW_MASK),
+        3 * TUPLE_SIZE + (packed >> 48),
+        4 * TUPLE_SIZE + (t & ROW_MASK),
+        5 * TUPLE_SIZE + ((t >> 16) & ROW_MASK),
+        6 * TUPLE_SIZE + ((t >> 32) & ROW_MASK),
+        7 * TUPLE_SIZE + (t >> 48),
+    ]
+    offset = 8 * TUPLE_SIZE
+    for shift in SQUARE_SHIFTS:
+        indexes.append(offset + (((packed >> shift) & 0xFF) | (((packed >> (shift + 16)) & 0xFF) << 8)))
+        offset += TUPLE_SIZE
+    return indexes
+
+
+def new_weights():
+    """Return a flat array of zero weights"""
+    return array('d', bytes(8 * NUM_TUPLES * TUPLE_SIZE))
+
+
+def save_weights(path, weights):
+    """Save weights to a binary file, atomically so that a crash never leaves a partial file"""
+    with atomic_open(path) as f:
+        f.write(WEIGHTS_HEADER.pack(WEIGHTS_MAGIC, NUM_TUPLES, TUPLE_SIZE))
+        weights.tofile(f)
+
+
+def load_weights(path):
+    """Load weights saved by `save_weights`"""
+    with open(path, 'rb') as f:
+        magic, num_tuples, tuple_size = WEIGHTS_HEADER.unpack(f.read(WEIGHTS_HEADER.size))
+        if (magic, num_tuples, tuple_size) != (WEIGHTS_MAGIC, NUM_TUPLES, TUPLE_SIZE):
+            raise ValueError('{} does not hold weights of this n-tuple network'.format(path))
+        weights = array('d')
+        weights.fromfile(f, num_tuples * tuple_size)
+    return weights
+
+
+class NTupleAgent(base_agent.BaseAgent):
+    """A game agent pick the next move maximizing the gained score plus the learnt value of the afterstate.
+
+    Parameters
+    ----------
+    weights : array or str, optional (default=None)
+        The flat weight array, or the path of a file saved by `save_weights`. If None, all weights are 0.
+    search_depth : int, optional (default=1)
+        See attributes.
+    learning_rate : float, optional (default=0.1)
+        See attributes.
+
+    Attributes
+    ----------
+    weights : array
+        The weights of all n-tuples, the ones of the k-th n-tuple at [k * TUPLE_SIZE, (k + 1) * TUPLE_SIZE).
+    search_depth : int
+        1 for a greedy choice over afterstates, every extra level adds an expectimax layer over the spawns
+        and the next move.
+    learning_rate : float
+        The TD(0) step size, shared by the 17 weights of a board.
+    """
+
+    def __init__(self, weights=None, search_depth=1, learning_rate=0.1):
+        super().__init__()
+        if weights is None:
+            weights = new_weights()
+        elif isinstance(weights, str):
+            weights = load_weights(weights)
+        self.weights = weights
+        self.search_depth = search_depth
+        self.learning_rate = learning_rate
+
+    def value(self, packed):
+        """Return the learnt value of a packed afterstate"""
+        weights = self.weights
+        return sum([weights[idx] for idx in tuple_indexes(packed)])
+
+    def best_afterstate(self, packed):
+        """Return the greedy (move, reward, afterstate, value) of a packed board, with move None if lost"""
+        best = (None, 0, packed, 0.)
+        best_total = None
+        for move in MOVES:
+            after, reward = execute_move(packed, move)
+            if after == packed:
+                continue
+            value = self.value(after)
+            if best_total is None or reward + value > best_total:
+                best_total = reward + value
+                best = (move, reward, after, value)
+        return best
+
+    def expected_value(self, after, depth):
+        """Return the expected value of an afterstate searched `depth` levels deep"""
+        if depth <= 1:
+            return self.value(after)
+        mask = empty_mask(after)
+        num_empty = bin(mask).count('1')
+        total = 0.
+        while mask:
+            idx = (mask & -mask).bit_length() - 1
+            mask &= mask - 1
+            for exponent, prob in SPAWN_PROBABILITIES:
+                board = after | (exponent << (4 * idx))
+                best = 0.
+                for move in MOVES:
+                    child, reward = execute_move(board, move)
+                    if child != board:
+                        best = max(best, reward + self.expected_value(child, depth - 1))
+                total += prob * best
+        return total / num_empty if num_empty else 0.
+
+    def get_move(self, game):
+        """Return the move maximizing the gained score plus the (searched) value of its afterstate"""
+        if game.size != BOARD_SIZE:
+            raise ValueError('The n-tuple network is learnt on 4x4 boards, not {0}x{0}'.format(game.size))
+        packed = packed_board_of(game)
+        if self.search_depth <= 1:
+            return self.best_afterstate(packed)[0]
+        best_move, best_total = None, None
+        for move in MOVES:
+            after, reward = execute_move(packed, move)
+            if after == packed:
+                continue
+            total = reward + self.expected_value(after, self.search_depth)
+            if best_total is None or total > best_total:
+                best_move, best_total = move, total
+        return best_move
+
+    def learn(self, indexes, error, updates=None):
+        """Move the weights of an afterstate, given by its n-tuple indexes, towards a TD target"""
+        delta = self.learning_rate / NUM_TUPLES * error
+        weights = self.weights
+        for idx in indexes:
+            weights[idx] += delta
+        if updates is not None:
+            for idx in indexes:
+                updates[idx] = updates.get(idx, 0.) + delta
+
+    def train_one_game(self, rng, updates=None):
+        """Play one greedy game from the learnt value and learn from it by TD(0) on afterstates
+
+        Parameters
+        ----------
+        rng : random.Random
+            The random generator of the spawns.
+        updates : dict, optional (default=None)
+            If given, the update of every weight is also added to it, by weight index.
+
+        Return
+        ----------
+        list
+            The game info in form of [score, best_tile, step].
+        """
+        board = random_spawn(random_spawn(0, rng), rng)
+        score = 0
+        step = 0
+        prev_indexes = prev_value = None
+        while True:
+            move, reward, after, value = self.best_afterstate(board)
+            if move is None:
+                break
+            if prev_indexes is not None:
+                self.learn(prev_indexes, reward + value - prev_value, updates)
+            prev_indexes, prev_value = tuple_indexes(after), value
+            score += reward
+            step += 1
+            board = random_spawn(after, rng)
+        if prev_indexes is not None:
+            # The value of a lost game is 0
+            self.learn(prev_indexes, -prev_value, updates)
+        best_tile = 1 << max((board >> (4 * idx)) & TILE_MASK for idx in range(16))
+        return [score, best_tile, step]
+
+
+def _train_games(weights, seeds, learning_rate):
+    """Train a copy of the weights on one game per seed in a worker, return the game infos and the updates"""
+    agent = NTupleAgent(weights, learning_rate=learning_rate)
+    updates = {}
+    infos = [agent.train_one_game(random.Random(seed), updates) for seed in seeds]
+    return infos, updates
+
+
+def train(agent, num_games, workers=1, games_per_round=100, seed=None, weights_path=None, verbose=True):
+    """Train an agent by TD(0) self-play
+
+    Parameters
+    ----------
+    agent : NTupleAgent
+        The agent whose weights are trained in place.
+    num_games : int
+        The number of games to play.
+    workers : int, optional (default=1)
+        If greater than 1, the games of every round are spread across a pool of this many processes.
+    games_per_round : int, optional (default=100)
+        The number of games played between two merges of the updates (and saves of the weights).
+    seed : int, optional (default=None)
+        If given, the i-th game is seeded with `seed + i`.
+    weights_path : str, optional (default=None)
+        If given, the weights are saved there after every round.
+    verbose : bool, optional (default=True)
+        If True, the mean score and the speed of every round are printed out.
+
+    Return
+    ----------
+    list
+        The info of every game, see `NTupleAgent.train_one_game`.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    results = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while len(results) < num_games:
+            start = time.time()
+            seeds = [seed + i for i in range(len(results), min(num_games, len(results) + games_per_round))]
+            if executor is None:
+                infos = [agent.train_one_game(random.Random(game_seed)) for game_seed in seeds]
+            else:
+                chunks = [seeds[k::workers] for k in range(workers) if seeds[k::workers]]
+                infos = []
+                for chunk_infos, updates in executor.map(_train_games, [agent.weights] * len(chunks), chunks,
+                                                         [agent.learning_rate] * len(chunks)):
+                    infos.extend(chunk_infos)
+                    weights = agent.weights
+                    for idx, delta in updates.items():
+                        weights[idx] += delta
+            results.extend(infos)
+            if weights_path is not None:
+                save_weights(weights_path, agent.weights)
+            if verbose:
+                elapsed = time.time() - start
+                print('Games {}/{}: mean score {:.0f}, best tile {}, {:.0f} moves/s'.format(
+                    len(results), num_games, sum(info[0] for info in infos) / len(infos),
+                    max(info[1] for info in infos), sum(info[2] for info in infos) / elapsed))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    command, num_games, path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    if command == 'train':
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+        ntuple_agent = NTupleAgent(path if os.path.exists(path) else None)
+        train(ntuple_agent, num_games, workers=workers, weights_path=path)
+    elif command == 'play':
+        from game import Bitboard2048
+
+        ntuple_agent = NTupleAgent(path, search_depth=int(sys.argv[4]) if len(sys.argv) > 4 else 1)
+        for _ in range(num_games):
+            game = Bitboard2048(game_mode=False)
+            start = time.time()
+            step = 0
+            while True:
+                move = ntuple_agent.get_move(game)
+                if move is None:
+                    break
+                game.perform_move(move)
+                game.perform_move(move)
+                step += 1
+            print('Score {}, best tile {}, {} moves, {:.0f} moves/s'.format(
+                game.score, max(max(row) for row in game.board), step, step / (time.time() - start)))
@@ -0,0 +1,88 @@
+import time
+
+
+class SearchStats:
+    """Counters and timings of the search of one move, filled by `MinimaxAgent.get_move`.
+
+    Attributes
+    ----------
+    nodes : int
+        The number of nodes visited by `search`.
+    leaves : int
+        The number of board evaluations.
+    beta_cutoffs : int
+        The number of agent nodes cut off because their value reached beta.
+    alpha_cutoffs : int
+        The number of computer nodes cut off because their value fell to alpha.
+    tt_hits : int
+        The number of nodes answered by the transposition table.
+    iterations : list
+        One (depth, seconds, nodes) tuple per completed iteration of the iterative deepening.
+    timed_out : bool
+        Whether the deadline interrupted the search.
+    empty_tiles : int
+        The number of empty tiles of the searched board.
+    max_tile : int
+        The max tile of the searched board.
+    move : int
+        The chosen move.
+    time_cost : float
+        The time spent in `get_move`.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Reset every counter"""
+        self.nodes = 0
+        self.leaves = 0
+        self.beta_cutoffs = 0
+        self.alpha_cutoffs = 0
+        self.tt_hits = 0
+        self.iterations = []
+        self.timed_out = False
+        self.empty_tiles = 0
+        self.max_tile = 0
+        self.move = None
+        self.time_cost = 0.
+        self._start = None
+        self._iteration_start = None
+        self._iteration_nodes = 0
+
+    def start_move(self, state):
+        """Reset the counters and describe the board of a new move"""
+        self.reset()
+        self.empty_tiles = state.get_num_empty_tiles()
+        self.max_tile = max(max(row) for row in state.board)
+        self._start = self._iteration_start = time.time()
+
+    def end_iteration(self, depth):
+        """Record a completed iteration of the iterative deepening"""
+        now = time.time()
+        self.iterations.append((depth, now - self._iteration_start, self.nodes - self._iteration_nodes))
+        self._iteration_start = now
+        self._iteration_nodes = self.nodes
+
+    def end_move(self, move, timed_out=False):
+        """Record the chosen move"""
+        self.move = move
+        self.timed_out = timed_out
+        self.time_cost = time.time() - self._start
+
+    def as_dict(self):
+        """Return the stats as a JSON serializable dict"""
+        return {
+            'move': self.move,
+            'time_cost': self.time_cost,
+            'empty_tiles': self.empty_tiles,
+            'max_tile': self.max_tile,
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'beta_cutoffs': self.beta_cutoffs,
+            'alpha_cutoffs': self.alpha_cutoffs,
+            'tt_hits': self.tt_hits,
+            'timed_out': self.timed_out,
+            'depth_completed': self.iterations[-1][0] if self.iterations else 0,
+            'iterations': [{'depth': d, 'time_cost': t, 'nodes': n} for d, t, n in self.iterations],
+        }
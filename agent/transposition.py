@@ -0,0 +1,102 @@
+from collections import OrderedDict
+
+# Bound types of a stored search value
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    """A bounded cache of search results keyed on compact game state keys.
+
+    Each entry stores the remaining search depth, the value, and whether the value is exact or only a
+    lower/upper bound produced by an alpha-beta cutoff.
+
+    Parameters
+    ----------
+    max_size : int
+        See attributes.
+    policy : str, optional (default='lru')
+        See attributes.
+
+    Attributes
+    ----------
+    max_size : int
+        The maximum number of entries kept in the table.
+    policy : str
+        The eviction policy once the table is full.
+        If 'lru', the least recently used entry is evicted.
+        If 'depth', the shallowest of the `sample_size` least recently used entries is evicted, so that
+        expensive deep results outlive cheap shallow ones.
+    hits : int
+        The number of lookups that found an entry.
+    misses : int
+        The number of lookups that found nothing.
+    evictions : int
+        The number of entries dropped to respect `max_size`.
+    """
+    sample_size = 8
+
+    def __init__(self, max_size=2 ** 16, policy='lru'):
+        assert max_size > 0
+        assert policy in ('lru', 'depth')
+        self.max_size = max_size
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups that found an entry"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def lookup(self, key):
+        """Return the (depth, value, flag) entry stored for the key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, value, flag):
+        """Store a search result, never replacing a deeper result of the same state"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > depth:
+                return
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.max_size:
+            self._evict()
+        self._entries[key] = (depth, value, flag)
+
+    def _evict(self):
+        """Drop one entry according to the eviction policy"""
+        if self.policy == 'lru':
+            self._entries.popitem(last=False)
+        else:
+            candidates = []
+            for key in self._entries:
+                candidates.append(key)
+                if len(candidates) == self.sample_size:
+                    break
+            victim = min(candidates, key=lambda k: self._entries[k][0])
+            del self._entries[victim]
+        self.evictions += 1
+
+    def clear(self):
+        """Drop all entries, the counters are kept"""
+        self._entries.clear()
+
+    def reset_stats(self):
+        """Reset the hit/miss/eviction counters"""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
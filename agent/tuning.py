@@ -0,0 +1,215 @@
+"""Tuning of the `MinimaxAgent` heuristic configuration by successive halving.
+
+Candidate configurations (heuristic weights, weight matrix and max tile credit) are sampled around the
+defaults of `MinimaxAgent`, the defaults themselves being the first candidate. Every round, the surviving
+candidates play a batch of short, shallow games, and only the best `1 / eta` of them survive to the next
+round, which plays `eta` times more games. Unpromising candidates are thus dropped after a few games while
+the best ones are compared on many. All candidates play the same seeded games (every game owns its spawn
+generator, see `Game2048`), so they are compared on identical spawn sequences. The defaults survive every
+round as an incumbent, so the best configuration has at least their mean score over the games of the last
+round. Games are spread across a pool of processes.
+
+The agents of the candidates still in the race are kept by the workers between games, the ones of dropped
+candidates are freed, and their evaluation tables never go to the table cache on disk.
+
+The best configuration is saved as JSON, to be loaded by `MinimaxAgent.from_config`.
+
+Usage: python -m agent.tuning [--candidates 32] [--games 4] [--eta 2] [--max-depth 3] [--max-moves 500]
+                              [--workers N] [--seed 0] [--output tuned_config.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent.evaluation import DEFAULT_WEIGHTS, HEURISTICS
+from agent.minimax_agent import MinimaxAgent, MAX_TILE_CREDIT, WEIGHT_MATRIX
+from game import Bitboard2048
+
+# Heuristic weights and the max tile credit are sampled log-uniformly within this factor of their defaults
+WEIGHT_RANGE = 10.
+# Entries of the weight matrix are sampled log-uniformly within this factor of their defaults
+MATRIX_RANGE = 2.
+
+_agents = {}
+
+
+def _log_uniform(rng, value, factor):
+    """Sample log-uniformly in [value / factor, value * factor]"""
+    return value * math.exp(rng.uniform(-math.log(factor), math.log(factor)))
+
+
+def default_config():
+    """Return the heuristic configuration of a default `MinimaxAgent`"""
+    return {
+        'heuristic_weights': dict(DEFAULT_WEIGHTS),
+        'weight_matrix': [list(row) for row in WEIGHT_MATRIX],
+        'max_tile_credit': MAX_TILE_CREDIT,
+    }
+
+
+def sample_config(rng):
+    """Sample a heuristic configuration around the defaults"""
+    return {
+        'heuristic_weights': {name: round(_log_uniform(rng, DEFAULT_WEIGHTS[name], WEIGHT_RANGE), 4)
+                              for name in HEURISTICS},
+        'weight_matrix': [[max(1, round(_log_uniform(rng, w, MATRIX_RANGE))) for w in row]
+                          for row in WEIGHT_MATRIX],
+        'max_tile_credit': round(_log_uniform(rng, MAX_TILE_CREDIT, WEIGHT_RANGE)),
+    }
+
+
+def config_key(config):
+    """Return the key of a configuration in the agents kept by `play_game`"""
+    return json.dumps(config, sort_keys=True)
+
+
+def play_game(config, seed, max_depth=3, max_moves=500, alive=None):
+    """Play one seeded game with a configuration and return its score
+
+    Agents are kept across the games of a worker process, so that the tables of a configuration are only
+    built once. If `alive` (a set of `config_key`) is given, the agents of the other configurations are
+    dropped first, freeing their tables.
+    """
+    if alive is not None:
+        for key in [key for key in _agents if key not in alive]:
+            del _agents[key]
+    key = config_key(config)
+    agent = _agents.get(key)
+    if agent is None or agent.max_depth != max_depth:
+        agent = _agents[key] = MinimaxAgent(max_depth=max_depth, cache_tables=False, **config)
+    game = Bitboard2048(game_mode=False, seed=seed)
+    for _ in range(max_moves):
+        move = agent.get_move(game)
+        if move is None:
+            break
+        game.perform_move(move)
+        game.perform_move(move)
+    return game.score
+
+
+def _play_game(args):
+    """Unpack the arguments of `play_game` for `Executor.map`"""
+    return play_game(*args)
+
+
+def successive_halving(configs, games=4, eta=2, max_depth=3, max_moves=500, workers=1, seed=0, verbose=True,
+                       incumbent=None):
+    """Rank configurations by successive halving
+
+    Parameters
+    ----------
+    configs : list
+        The candidate configurations.
+    games : int, optional (default=4)
+        The number of games played by every candidate in the first round.
+    eta : int, optional (default=2)
+        Every round keeps the best `1 / eta` of the candidates and plays `eta` times more games.
+    max_depth : int, optional (default=3)
+        The max depth of the agents, see `MinimaxAgent`.
+    max_moves : int, optional (default=500)
+        Games are stopped after this many moves, so that good candidates do not play for hours.
+    workers : int, optional (default=1)
+        The number of processes playing the games.
+    seed : int, optional (default=0)
+        The seed of the first game, the following games are seeded with the next integers.
+    verbose : bool, optional (default=True)
+        If True, the leaders of every round are printed out.
+    incumbent : int, optional (default=None)
+        The index of a configuration (e.g. the defaults) kept in every round, so that the final candidates
+        are compared with it on the most games.
+
+    Return
+    ----------
+    list
+        (mean score, number of games, config index) of every candidate, best first. Candidates dropped
+        early are ranked after the ones which survived longer.
+    """
+    scores = {idx: [] for idx in range(len(configs))}
+    alive = list(range(len(configs)))
+    ranking = []
+    round_games = games
+    next_seed = seed
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            start = time.time()
+            seeds = list(range(next_seed, next_seed + round_games))
+            next_seed += round_games
+            alive_keys = frozenset(config_key(configs[idx]) for idx in alive)
+            tasks = [(configs[idx], game_seed, max_depth, max_moves, alive_keys)
+                     for idx in alive for game_seed in seeds]
+            if executor is None:
+                results = list(map(_play_game, tasks))
+            else:
+                results = list(executor.map(_play_game, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+            for idx, score in zip([idx for idx in alive for _ in seeds], results):
+                scores[idx].append(score)
+
+            alive.sort(key=lambda i: sum(scores[i]) / len(scores[i]), reverse=True)
+            if verbose:
+                print('Round of {} games: {} candidates, {:.0f}s, leaders {}'.format(
+                    round_games, len(alive), time.time() - start, ', '.join(
+                        '#{} {:.0f}'.format(i, sum(scores[i]) / len(scores[i])) for i in alive[:3])))
+            keep = max(1, len(alive) // eta)
+            survivors = alive[:keep]
+            if incumbent in alive[keep:]:
+                survivors.append(incumbent)
+            if len(survivors) == len(alive):
+                break
+            ranking = [idx for idx in alive if idx not in survivors] + ranking
+            alive = survivors
+            if len(alive) == 1:
+                break
+            round_games *= eta
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _agents.clear()
+
+    ranking = alive + ranking
+    return [(sum(scores[idx]) / len(scores[idx]), len(scores[idx]), idx) for idx in ranking]
+
+
+def tune(num_candidates=32, games=4, eta=2, max_depth=3, max_moves=500, workers=1, seed=0, output=None,
+         verbose=True):
+    """Sample candidate configurations, rank them by successive halving and return the best one
+
+    The defaults are the first candidate and the incumbent of `successive_halving`. If `output` is given, the
+    best configuration is saved there. See `successive_halving` for the other parameters.
+    """
+    rng = random.Random(seed)
+    configs = [default_config()] + [sample_config(rng) for _ in range(num_candidates - 1)]
+    ranking = successive_halving(configs, games, eta, max_depth, max_moves, workers, seed, verbose, incumbent=0)
+    mean_score, num_games, best = ranking[0]
+    if verbose:
+        print('Best candidate #{}: mean score {:.0f} over {} games{}'.format(
+            best, mean_score, num_games, ' (the defaults)' if best == 0 else ''))
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(configs[best], f, indent=2)
+    return configs[best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the heuristic configuration of MinimaxAgent')
+    parser.add_argument('--candidates', type=int, default=32, help='number of sampled configurations')
+    parser.add_argument('--games', type=int, default=4, help='games per candidate in the first round')
+    parser.add_argument('--eta', type=int, default=2, help='fraction of candidates dropped every round')
+    parser.add_argument('--max-depth', type=int, default=3, help='max depth of the agents')
+    parser.add_argument('--max-moves', type=int, default=500, help='moves after which games are stopped')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the candidates and of the games')
+    parser.add_argument('--output', default='tuned_config.json', help='path of the best configuration')
+    args = parser.parse_args()
+    tune(args.candidates, args.games, args.eta, args.max_depth, args.max_moves, args.workers, args.seed,
+         args.output)
+    print('Saved to {}, load it with MinimaxAgent.from_config'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
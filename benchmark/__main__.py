@@ -0,0 +1,55 @@
+"""Run the benchmark suite.
+
+Usage: python -m benchmark [--save] [--baseline PATH] [--threshold FRACTION] [--boards N] [--depths 2,4,6]
+                           [--sizes 4,5,6] [--repeat N]
+
+Rates are only comparable on the machine which produced the baseline. The committed `benchmark/baseline.json`
+was produced with `python -m benchmark --repeat 5 --save` on the machine named in it. On another machine, first
+run the same command on the commit to compare against, then run `python -m benchmark --repeat 5` on the change.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+from benchmark import suite
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the engine and agent hot paths')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--baseline', default=suite.DEFAULT_BASELINE, help='path of the JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown flagged as a regression')
+    parser.add_argument('--boards', type=int, default=8, help='number of seeded boards')
+    parser.add_argument('--depths', default='2,4,6', help='comma separated get_move depths')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal seconds spent per engine case')
+    parser.add_argument('--sizes', default=','.join(map(str, suite.DEFAULT_SIZES)),
+                        help='comma separated board sizes of the scaling cases')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of runs of the suite, the median rate of every case is kept')
+    args = parser.parse_args()
+
+    depths = [int(d) for d in args.depths.split(',') if d]
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    runs = [suite.run(args.boards, depths, args.min_time, sizes) for _ in range(args.repeat)]
+    results = {case: statistics.median(run[case] for run in runs) for case in runs[0]}
+    baseline = suite.load_baseline(args.baseline) if os.path.exists(args.baseline) else {}
+
+    report = {case: (change, flagged) for case, _, _, change, flagged in
+              suite.compare(results, baseline, args.threshold)}
+    for case, rate in sorted(results.items()):
+        line = '{:<40} {:>14,.0f}/s'.format(case, rate)
+        if case in report:
+            change, flagged = report[case]
+            line += '  {:+7.1%} vs baseline{}'.format(change, '  REGRESSION' if flagged else '')
+        print(line)
+
+    if args.save:
+        suite.save_baseline(results, args.baseline)
+        print('Baseline saved to {}'.format(args.baseline))
+    return 1 if any(flagged for _, flagged in report.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Measure the memory and allocations taken by search nodes, Game2048 copies vs GameState values.
+
+Usage: python -m benchmark.node_memory [num_nodes]
+"""
+
+import sys
+import tracemalloc
+
+from benchmark.search_speed import seeded_boards
+from game import GameState
+
+
+def expand(root, num_nodes):
+    """Collect `num_nodes` nodes by expanding the agent's moves and the computer's spawns breadth first"""
+    nodes = [root]
+    frontier = [root]
+    while len(nodes) < num_nodes and frontier:
+        node = frontier.pop(0)
+        if node.active_player == root.active_player:
+            children = [child for _, child, _ in node.children()]
+        elif isinstance(node, GameState):
+            children = [node.spawn(tile) for tile in node.empty_tiles()]
+        else:
+            children = []
+            for tile in node.empty_tiles():
+                child = node.copy()
+                child.fill_specific_empty_tile(tile)
+                child.switch_player()
+                children.append(child)
+        nodes.extend(children)
+        frontier.extend(children)
+    return nodes[:num_nodes]
+
+
+def measure(root, num_nodes):
+    """Return (bytes per node, allocated blocks per node) of the nodes expanded from the root"""
+    tracemalloc.start()
+    before_size, _ = tracemalloc.get_traced_memory()
+    before_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    nodes = expand(root, num_nodes)
+    after_size, _ = tracemalloc.get_traced_memory()
+    after_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    count = len(nodes)
+    del nodes
+    return (after_size - before_size) / count, (after_blocks - before_blocks) / count
+
+
+if __name__ == '__main__':
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    game = seeded_boards(1)[0]
+    # Build lookup tables outside of the measurement
+    GameState.from_game(game).children()
+    for name, root in (('Game2048', game), ('GameState', GameState.from_game(game))):
+        size, blocks = measure(root, num_nodes)
+        print('{:>10}: {:.0f} bytes/node, {:.1f} live allocations/node'.format(name, size, blocks))
@@ -0,0 +1,65 @@
+"""Measure how many search nodes per second MinimaxAgent expands.
+
+Usage: python -m benchmark.search_speed [max_depth] [num_boards]
+"""
+
+import sys
+import time
+import random
+
+from agent import MinimaxAgent
+from game import Game2048
+
+
+class CountingMinimaxAgent(MinimaxAgent):
+    """A MinimaxAgent counting every node visited by `search`"""
+
+    def __init__(self, max_depth=8):
+        super().__init__(max_depth=max_depth)
+        self.nodes = 0
+
+    def search(self, game, alpha, beta, depth, max_depth):
+        self.nodes += 1
+        return super().search(game, alpha, beta, depth, max_depth)
+
+
+def seeded_boards(num_boards, seed=2048, warmup_moves=30, size=4):
+    """Generate reproducible mid-game boards of `size` x `size` tiles by playing random moves from a seeded game"""
+    random.seed(seed)
+    games = []
+    while len(games) < num_boards:
+        # Spawns and moves share the global generator, as when the baseline boards were generated
+        game = Game2048(game_mode=False, rng=random, size=size)
+        for _ in range(warmup_moves):
+            # Older engines may draw random numbers while checking moves, keep the spawns reproducible anyway
+            state = random.getstate()
+            available = game.moves_available()
+            random.setstate(state)
+            if not available:
+                break
+            move = random.choice(available)
+            game.perform_move(move)
+            game.perform_move(move)
+        if not game.is_lost():
+            games.append(game)
+    return games
+
+
+def measure(max_depth=6, num_boards=3):
+    """Return (nodes, seconds) spent by `get_move` on the seeded boards"""
+    agent = CountingMinimaxAgent(max_depth=max_depth)
+    games = seeded_boards(num_boards)
+    # Build lookup tables outside of the measurement
+    agent.evaluate(games[0])
+    start = time.time()
+    for game in games:
+        agent.get_move(game)
+    return agent.nodes, time.time() - start
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    boards = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    nodes, seconds = measure(depth, boards)
+    print('max_depth={} boards={} nodes={} time={:.3f}s nodes/sec={:.0f}'.format(
+        depth, boards, nodes, seconds, nodes / seconds))
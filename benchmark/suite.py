@@ -0,0 +1,145 @@
+"""Benchmarks of the engine and agent hot paths on a fixed set of seeded boards.
+
+Every case reports a rate: ops/sec for engine calls and evaluations, nodes/sec for `get_move`.
+Cases prefixed with a board size, e.g. '5x5 Bitboard2048.perform_move', show how throughput scales with it.
+Results can be saved as a JSON baseline, and later runs are compared against it so that
+regressions are flagged instead of guessed.
+"""
+
+import json
+import platform
+import time
+
+from agent import MinimaxAgent
+from benchmark.search_speed import CountingMinimaxAgent, seeded_boards
+from game import Bitboard2048
+
+DEFAULT_BASELINE = 'benchmark/baseline.json'
+BACKENDS = ('Game2048', 'Bitboard2048')
+DEFAULT_SIZES = (4, 5, 6)
+# The depth of the get_move cases of every board size
+SIZE_SEARCH_DEPTH = 3
+
+
+def _rate(func, items, min_time):
+    """Call `func` on every item, repeatedly until `min_time` passed, and return the calls per second"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        calls += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def _to_bitboard(game):
+    """Convert a game to the bitboard backend"""
+    new_game = Bitboard2048(task_name=game.task_name, game_mode=game.game_mode, size=game.size)
+    new_game.board = game.board
+    new_game.score = game.score
+    return new_game
+
+
+def engine_cases(games, min_time):
+    """Time `perform_move`, `moves_available` and `is_lost` on both backends"""
+    results = {}
+    for backend in BACKENDS:
+        boards = games if backend == 'Game2048' else [_to_bitboard(g) for g in games]
+        moves = [(g, g.moves_available()[0]) for g in boards]
+
+        def perform_move(item):
+            game, move = item
+            game.copy().perform_move(move)
+
+        copy_rate = _rate(lambda g: g.copy(), boards, min_time)
+        move_rate = _rate(perform_move, moves, min_time)
+        # perform_move needs a fresh copy every time, take the copy cost out
+        results['{}.perform_move'.format(backend)] = 1 / max(1 / move_rate - 1 / copy_rate, 1e-9)
+        results['{}.moves_available'.format(backend)] = _rate(lambda g: g.moves_available(), boards, min_time)
+        results['{}.is_lost'.format(backend)] = _rate(lambda g: g.is_lost(), boards, min_time)
+    return results
+
+
+def evaluate_cases(games, min_time):
+    """Time `MinimaxAgent.evaluate` on both backends"""
+    agent = MinimaxAgent()
+    # Build lookup tables outside of the measurement
+    agent.evaluate(games[0])
+    return {
+        'MinimaxAgent.evaluate[Game2048]': _rate(agent.evaluate, games, min_time),
+        'MinimaxAgent.evaluate[Bitboard2048]': _rate(agent.evaluate, [_to_bitboard(g) for g in games], min_time),
+    }
+
+
+def search_cases(games, depths):
+    """Time full `get_move` calls and report the search nodes per second"""
+    results = {}
+    for depth in depths:
+        agent = CountingMinimaxAgent(max_depth=depth)
+        agent.evaluate(games[0])
+        start = time.perf_counter()
+        for game in games:
+            agent.get_move(game)
+        results['MinimaxAgent.get_move[depth={}]'.format(depth)] = agent.nodes / (time.perf_counter() - start)
+    return results
+
+
+def size_cases(sizes, num_boards, min_time):
+    """Time the engine cases and `get_move` on boards of every size
+
+    Boards are warmed up for a number of moves proportional to their number of tiles, so that they are
+    about as full whatever the size.
+    """
+    results = {}
+    for size in sizes:
+        games = seeded_boards(num_boards, warmup_moves=2 * size * size, size=size)
+        # Build the row tables of the size outside of the measurement
+        _to_bitboard(games[0]).moves_available()
+        cases = engine_cases(games, min_time)
+        cases.update(search_cases([_to_bitboard(g) for g in games], [SIZE_SEARCH_DEPTH]))
+        results.update(('{0}x{0} {1}'.format(size, case), rate) for case, rate in cases.items())
+    return results
+
+
+def run(num_boards=8, depths=(2, 4, 6), min_time=0.2, sizes=DEFAULT_SIZES):
+    """Run every benchmark case and return {case: rate}"""
+    games = seeded_boards(num_boards)
+    results = {}
+    results.update(engine_cases(games, min_time))
+    results.update(evaluate_cases(games, min_time))
+    results.update(search_cases(games, depths))
+    results.update(size_cases(sizes, num_boards, min_time))
+    return results
+
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    """Save the results as a JSON baseline"""
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                  f, indent=2, sort_keys=True)
+
+
+def load_baseline(path=DEFAULT_BASELINE):
+    """Load the results of a JSON baseline"""
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold=0.2):
+    """Compare results with a baseline
+
+    Return
+    ----------
+    list
+        A list of (case, rate, baseline rate, relative change, regressed) tuples for cases in both.
+        A case regressed when its rate dropped by more than `threshold` (a fraction of the baseline rate).
+    """
+    report = []
+    for case in sorted(results):
+        if case not in baseline:
+            continue
+        change = results[case] / baseline[case] - 1
+        report.append((case, results[case], baseline[case], change, change < -threshold))
+    return report
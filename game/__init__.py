@@ -1 +1,3 @@
 from .game import Game2048
+from .bitboard import Bitboard2048
+from .state import GameState, SizedGameState
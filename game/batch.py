@@ -0,0 +1,226 @@
+"""Run thousands of 2048 games in lockstep with NumPy.
+
+Boards are held in a single (N, 4, 4) array of tile exponents. Every step packs all rows into 16-bit ints,
+resolves the four moves of every game at once through the row tables of `game.bitboard`, then applies the
+chosen moves, spawns and game-over checks with array operations. The rules are exactly the ones of `Game2048`.
+
+This module requires NumPy, which the rest of the package does not need.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from .bitboard import mapped_tables
+from .results import get_sink
+
+MOVES = (0, 1, 2, 3)
+
+
+def random_policy(batch, legal):
+    """Pick a random legal move for every game, like `RandomAgent`"""
+    keys = batch.rng.random(legal.shape)
+    keys[~legal] = -1
+    return keys.argmax(axis=1)
+
+
+def greedy_policy(batch, legal):
+    """Pick the legal move with the highest immediate score for every game, preferring LEFT, RIGHT, UP, DOWN"""
+    scores = batch.move_scores.T.astype(np.float64)
+    scores[~legal] = -1
+    return scores.argmax(axis=1)
+
+
+class BatchGame2048:
+    """N games of 2048 played in lockstep.
+
+    Parameters
+    ----------
+    num_games : int
+        The number of games played at once.
+    seed : int, optional (default=None)
+        The seed of the random generator used for spawns and random moves.
+
+    Attributes
+    ----------
+    boards : numpy.ndarray
+        The (N, 4, 4) array of tile exponents (0 for an empty tile, 1 for 2, 2 for 4, ...).
+    scores : numpy.ndarray
+        The score of every game.
+    steps : numpy.ndarray
+        The number of moves performed in every game.
+    ended : numpy.ndarray
+        Whether every game is ended.
+    time_costs : numpy.ndarray
+        The wall-clock time from the start of `run` to the end of every game.
+    move_scores : numpy.ndarray
+        The (4, N) scores every move would gain on the current boards, see `refresh_moves`.
+    rng : numpy.random.Generator
+        The random generator of the batch.
+    """
+
+    def __init__(self, num_games, seed=None):
+        row_left, row_right, score_left, score_right = mapped_tables()
+        # The row tables are views of the mapped table cache, shared with the other processes
+        self._row_tables = (np.frombuffer(row_left, dtype=np.uint16), np.frombuffer(row_right, dtype=np.uint16))
+        self._score_tables = (np.frombuffer(score_left, dtype=np.uint32).astype(np.int64),
+                              np.frombuffer(score_right, dtype=np.uint32).astype(np.int64))
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((num_games, 4, 4), dtype=np.uint8)
+        self.scores = np.zeros(num_games, dtype=np.int64)
+        self.steps = np.zeros(num_games, dtype=np.int64)
+        self.ended = np.zeros(num_games, dtype=bool)
+        self.time_costs = np.zeros(num_games, dtype=np.float64)
+        self.move_scores = np.zeros((4, num_games), dtype=np.int64)
+        self._moved = None
+        all_games = np.ones(num_games, dtype=bool)
+        self.spawn(all_games)
+        self.spawn(all_games)
+
+    def __len__(self):
+        return len(self.boards)
+
+    def set_boards(self, packed_boards):
+        """Restart every game from the given packed board (see `game.bitboard`), e.g. for rollouts"""
+        packed = np.array(packed_boards, dtype=np.uint64)
+        shifts = np.arange(16, dtype=np.uint64) * np.uint64(4)
+        exponents = (packed[:, np.newaxis] >> shifts) & np.uint64(0xF)
+        self.boards = exponents.astype(np.uint8).reshape(len(packed), 4, 4)
+        self.scores = np.zeros(len(packed), dtype=np.int64)
+        self.steps = np.zeros(len(packed), dtype=np.int64)
+        self.ended = np.zeros(len(packed), dtype=bool)
+        self.time_costs = np.zeros(len(packed), dtype=np.float64)
+        self.move_scores = np.zeros((4, len(packed)), dtype=np.int64)
+        self._moved = None
+
+    @staticmethod
+    def _pack_rows(boards):
+        """Pack (N, 4, 4) exponents into (N, 4) 16-bit rows"""
+        b = boards.astype(np.uint16)
+        return b[..., 0] | (b[..., 1] << 4) | (b[..., 2] << 8) | (b[..., 3] << 12)
+
+    @staticmethod
+    def _unpack_rows(rows):
+        """Unpack (N, 4) 16-bit rows into (N, 4, 4) exponents"""
+        shifts = np.array([0, 4, 8, 12], dtype=np.uint16)
+        return ((rows[..., np.newaxis] >> shifts) & 0xF).astype(np.uint8)
+
+    def _slide(self, boards, direction):
+        """Merge all rows of all boards, to the left if `direction` is 0, to the right if 1"""
+        rows = self._pack_rows(boards)
+        moved = self._unpack_rows(self._row_tables[direction][rows])
+        return moved, self._score_tables[direction][rows].sum(axis=1)
+
+    def refresh_moves(self):
+        """Compute the boards and scores of all four moves for every game
+
+        Return
+        ----------
+        numpy.ndarray
+            The (N, 4) boolean array of legal moves.
+        """
+        transposed = self.boards.transpose(0, 2, 1)
+        left, left_score = self._slide(self.boards, 0)
+        right, right_score = self._slide(self.boards, 1)
+        up, up_score = self._slide(transposed, 0)
+        down, down_score = self._slide(transposed, 1)
+        self._moved = np.stack([left, right, up.transpose(0, 2, 1), down.transpose(0, 2, 1)])
+        self.move_scores = np.stack([left_score, right_score, up_score, down_score])
+        legal = (self._moved != self.boards[np.newaxis]).any(axis=(2, 3)).T
+        legal[self.ended] = False
+        return legal
+
+    def spawn(self, mask):
+        """Fill a random empty tile with 2 or 4 (prob 90% and 10%) in every game selected by the mask"""
+        flat = self.boards.reshape(len(self), 16)
+        empty = flat == 0
+        mask = mask & empty.any(axis=1)
+        keys = self.rng.random(flat.shape)
+        keys[~empty] = -1
+        positions = keys.argmax(axis=1)
+        exponents = np.where(self.rng.random(len(self)) > 0.9, 2, 1).astype(np.uint8)
+        games = np.nonzero(mask)[0]
+        flat[games, positions[games]] = exponents[games]
+
+    def step(self, policy=random_policy, random_prob=0.):
+        """Play one move in every running game
+
+        Parameters
+        ----------
+        policy : callable
+            Called with the batch and the (N, 4) legal move mask, returns the move of every game. An illegal move
+            leaves its game unchanged: no step is counted and no tile spawns.
+        random_prob : float, optional (default=0.)
+            The probability of playing a random legal move instead of the policy's one.
+
+        Return
+        ----------
+        int
+            The number of games still running.
+        """
+        legal = self.refresh_moves()
+        self.ended |= ~legal.any(axis=1)
+        active = ~self.ended
+        if not active.any():
+            return 0
+
+        moves = np.asarray(policy(self, legal))
+        if random_prob > 0:
+            explore = self.rng.random(len(self)) < random_prob
+            moves = np.where(explore, random_policy(self, legal), moves)
+
+        moved = active & legal[np.arange(len(self)), moves]
+        games = np.nonzero(moved)[0]
+        self.boards[games] = self._moved[moves[games], games]
+        self.scores[games] += self.move_scores[moves[games], games]
+        self.steps[games] += 1
+        self.spawn(moved)
+        return int(active.sum())
+
+    def run(self, policy=random_policy, random_prob=0., max_steps=None):
+        """Play all games until they end (or for at most `max_steps` moves)
+
+        Return
+        ----------
+        list
+            The info of every game in form of [score, best_tile, step, time_cost, seed], like `Game2048.game_info`.
+        """
+        start = time.time()
+        step = 0
+        while max_steps is None or step < max_steps:
+            running = ~self.ended
+            remaining = self.step(policy, random_prob)
+            self.time_costs[running & self.ended] = time.time() - start
+            if remaining == 0:
+                break
+            step += 1
+        self.time_costs[~self.ended] = time.time() - start
+        return self.game_info()
+
+    def game_info(self):
+        """Return [score, best_tile, step, time_cost, seed] of every game
+
+        The games share one random generator, so no seed replays a single game and the seed is None.
+        """
+        best_tiles = (1 << self.boards.reshape(len(self), 16).max(axis=1).astype(np.int64))
+        return [[int(score), int(best), int(step), float(cost), None]
+                for score, best, step, cost in zip(self.scores, best_tiles, self.steps, self.time_costs)]
+
+    def save_game_info(self, task_name):
+        """Append the info of every game to '{task_name}.csv'"""
+        sink = get_sink(task_name)
+        sink.write_many(self.game_info())
+        sink.flush()
+
+
+if __name__ == '__main__':
+    # python -m game.batch <num_games> <random_prob> <task_name>
+    num_games = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    random_prob = float(sys.argv[2]) if len(sys.argv) > 2 else 0.
+    batch = BatchGame2048(num_games)
+    start = time.time()
+    batch.run(greedy_policy, random_prob)
+    print('{} games in {:.2f}s, mean score {:.1f}'.format(num_games, time.time() - start, batch.scores.mean()))
+    if len(sys.argv) > 3:
+        batch.save_game_info(sys.argv[3])
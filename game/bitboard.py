@@ -0,0 +1,669 @@
+"""A packed 64-bit backend for the 2048 game.
+
+The board is stored as a single int where every tile takes 4 bits holding the exponent of its value
+(0 for an empty tile, 1 for 2, 2 for 4, ..., 15 for 32768). Row `i` lives in bits `16 * i` to `16 * i + 15`
+and column `j` of a row lives in bits `4 * j` to `4 * j + 3` of that row.
+
+Moves are resolved by looking every row up in precomputed 65536-entry tables, so a move costs four
+table lookups (plus two transposes for up/down) instead of rebuilding Python lists. The tables are built
+once and cached on disk, see `game.tables`.
+
+Boards of other sizes use the same layout on a wider int, see `BoardShape`: row `i` of a `size` x `size` board
+lives in bits `4 * size * i` onwards, and moves look rows up in tables with one entry per `4 * size`-bit row.
+"""
+
+from array import array
+from functools import lru_cache
+from operator import itemgetter
+
+from .game import Game2048
+from .tables import load_tables
+
+ROW_MASK = 0xFFFF
+TILE_MASK = 0xF
+MAX_EXPONENT = 15
+BOARD_SIZE = 4
+# Rows up to this many tiles get precomputed tables (16 ** 5 entries), wider rows are merged on first sight
+MAX_TABLE_ROW_SIZE = 5
+# Array type codes of the row_left, row_right, score_left and score_right tables
+TABLE_TYPECODES = ('H', 'H', 'I', 'I')
+# The lowest bit of every tile, the highest bit of every tile, the lowest bit of the tiles of the last column and
+# of the tiles of the last row
+TILE_ONES = 0x1111111111111111
+TILE_EIGHTS = 0x8888888888888888
+LAST_COLUMN_ONES = 0x1000100010001000
+LAST_ROW_ONES = 0x1111000000000000
+
+_tables = None
+
+
+def _merge_row(tiles):
+    """Merge a row of exponents to the left
+
+    This mirrors `Game2048._merge`: only the first pair of identical neighbors is merged, except for
+    rows in form of [A, A, B, B] which become [2A, 2B] (and, like in `Game2048`, add nothing to the score).
+
+    Parameters
+    ----------
+    tiles : list
+        A list of 4 exponents, e.g. [1, 1, 0, 0] represents the row [2, 2, 0, 0].
+
+    Return
+    ----------
+    tuple
+        The first element is the merged row (a list of exponents).
+        The second element is the score gained by the merge.
+    """
+    store = [t for t in tiles if t != 0]
+    score = 0
+
+    if len(store) == 4 and store[0] == store[1] and store[2] == store[3]:
+        store = [store[0] + 1, store[2] + 1]
+    else:
+        for idx in range(len(store) - 1):
+            if store[idx] == store[idx + 1]:
+                store[idx] += 1
+                score = 2 ** store[idx]
+                store.pop(idx + 1)
+                break
+
+    return store + [0] * (len(tiles) - len(store)), score
+
+
+def _reverse_row(row):
+    """Mirror a packed row"""
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def _build_tables():
+    """Build the left/right row tables and their score tables"""
+    size = ROW_MASK + 1
+    row_left = [0] * size
+    row_right = [0] * size
+    score_left = [0] * size
+    score_right = [0] * size
+
+    for row in range(size):
+        tiles = [(row >> (4 * j)) & TILE_MASK for j in range(4)]
+        merged, score = _merge_row(tiles)
+        # A merge of two 32768 tiles cannot be represented, leave these rows untouched
+        if max(merged) > MAX_EXPONENT:
+            merged, score = tiles, 0
+        result = merged[0] | (merged[1] << 4) | (merged[2] << 8) | (merged[3] << 12)
+        row_left[row] = result
+        score_left[row] = score
+
+        mirrored = _reverse_row(row)
+        row_right[mirrored] = _reverse_row(result)
+        score_right[mirrored] = score
+
+    return row_left, row_right, score_left, score_right
+
+
+def mapped_tables():
+    """Return the (row_left, row_right, score_left, score_right) tables as memoryviews of the table cache"""
+    return load_tables('bitboard', MAX_EXPONENT, _build_tables, TABLE_TYPECODES)
+
+
+def get_tables():
+    """Return the (row_left, row_right, score_left, score_right) tables as lists, loading them on first use
+
+    Lists are copied out of the mapped tables since indexing a list is about twice as fast as indexing a
+    memoryview, and the engine looks rows up in its innermost loops.
+    """
+    global _tables
+    if _tables is None:
+        _tables = tuple(table.tolist() for table in mapped_tables())
+    return _tables
+
+
+def pack_board(board):
+    """Pack a list-of-lists board of any size into an int, 64 bits for the 4x4 board"""
+    packed = 0
+    shift = 0
+    for row in board:
+        for tile in row:
+            if tile:
+                exponent = tile.bit_length() - 1
+                if exponent > MAX_EXPONENT:
+                    raise ValueError('Tile {} cannot be packed into 4 bits'.format(tile))
+                packed |= exponent << shift
+            shift += 4
+    return packed
+
+
+def packed_board_of(game):
+    """Return the packed board of a game of any backend, or of a `GameState`"""
+    packed = getattr(game, 'packed_board', None)
+    return packed if packed is not None else pack_board(game.board)
+
+
+def unpack_board(packed):
+    """Unpack a 64-bit int into a list-of-lists board"""
+    board = []
+    for i in range(4):
+        row = []
+        for j in range(4):
+            exponent = (packed >> (16 * i + 4 * j)) & TILE_MASK
+            row.append(1 << exponent if exponent else 0)
+        board.append(row)
+    return board
+
+
+def transpose(packed):
+    """Transpose a packed board, i.e. swap tile (i, j) with tile (j, i)"""
+    a1 = packed & 0xF0F00F0FF0F00F0F
+    a2 = packed & 0x0000F0F00000F0F0
+    a3 = packed & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _move_rows(packed, row_table, score_table):
+    """Apply a row table on all 4 rows"""
+    r0 = packed & ROW_MASK
+    r1 = (packed >> 16) & ROW_MASK
+    r2 = (packed >> 32) & ROW_MASK
+    r3 = packed >> 48
+    result = row_table[r0] | (row_table[r1] << 16) | (row_table[r2] << 32) | (row_table[r3] << 48)
+    return result, score_table[r0] + score_table[r1] + score_table[r2] + score_table[r3]
+
+
+def execute_move(packed, move):
+    """Perform a move on a packed board
+
+    Parameters
+    ----------
+    packed : int
+        The packed game board.
+    move : int
+        0 for LEFT, 1 for RIGHT, 2 for UP, 3 for DOWN.
+
+    Return
+    ----------
+    tuple
+        The first element is the packed board after the move.
+        The second element is the score gained by the move.
+    """
+    row_left, row_right, score_left, score_right = get_tables()
+    if move == 0:
+        return _move_rows(packed, row_left, score_left)
+    elif move == 1:
+        return _move_rows(packed, row_right, score_right)
+    elif move == 2:
+        result, score = _move_rows(transpose(packed), row_left, score_left)
+        return transpose(result), score
+    elif move == 3:
+        result, score = _move_rows(transpose(packed), row_right, score_right)
+        return transpose(result), score
+    return packed, 0
+
+
+def legal_moves(packed):
+    """Return the moves changing a packed board, in the order LEFT, RIGHT, UP, DOWN
+
+    A left (right) move changes the board iff it changes one row, so the rows are looked up without building
+    the boards after the moves.
+    """
+    row_left, row_right = get_tables()[:2]
+    moves = []
+    for left, board in ((0, packed), (2, transpose(packed))):
+        r0 = board & ROW_MASK
+        r1 = (board >> 16) & ROW_MASK
+        r2 = (board >> 32) & ROW_MASK
+        r3 = board >> 48
+        if row_left[r0] != r0 or row_left[r1] != r1 or row_left[r2] != r2 or row_left[r3] != r3:
+            moves.append(left)
+        if row_right[r0] != r0 or row_right[r1] != r1 or row_right[r2] != r2 or row_right[r3] != r3:
+            moves.append(left + 1)
+    return moves
+
+
+def empty_positions(packed):
+    """Get coordinates of all empty tiles (in format of [row, col]) in row-major order"""
+    empty = []
+    for idx in range(16):
+        if not (packed >> (4 * idx)) & TILE_MASK:
+            empty.append([idx >> 2, idx & 3])
+    return empty
+
+
+def count_empty(packed):
+    """Count the empty tiles on a packed board"""
+    # Fold every nibble onto its lowest bit, which is then 0 only for empty tiles
+    packed |= (packed >> 2) & 0x3333333333333333
+    packed |= packed >> 1
+    return bin(~packed & 0x1111111111111111).count('1')
+
+
+def empty_mask(packed):
+    """Return a 16-bit mask where bit `idx` is set iff tile `idx` (in row-major order) is empty"""
+    packed |= (packed >> 2) & 0x3333333333333333
+    packed |= packed >> 1
+    mask = ~packed & 0x1111111111111111
+    # Gather the lowest bit of every nibble into the lowest 16 bits
+    mask = (mask | (mask >> 3)) & 0x0303030303030303
+    mask = (mask | (mask >> 6)) & 0x000F000F000F000F
+    mask = (mask | (mask >> 12)) & 0x000000FF000000FF
+    return (mask | (mask >> 24)) & 0xFFFF
+
+
+def nth_set_bit(mask, n):
+    """Return the index of the n-th (from 0) lowest set bit of a mask"""
+    for _ in range(n):
+        mask &= mask - 1
+    return (mask & -mask).bit_length() - 1
+
+
+def random_spawn(packed, rng):
+    """Fill a random empty tile of a packed board with 2 or 4, prob 90% and 10%, respectively
+
+    The tile is sampled from the empty tile mask, drawing the same random numbers as
+    `Game2048._fill_random_empty_tile`.
+    """
+    mask = empty_mask(packed)
+    if not mask:
+        return packed
+    idx = nth_set_bit(mask, rng.randrange(bin(mask).count('1')))
+    return packed | ((2 if rng.random() > 0.9 else 1) << (4 * idx))
+
+
+def is_mergeable(packed):
+    """Return whether there exists an empty tile or at least one pair of identical neighbors"""
+    # Subtracting 1 from every tile only sets the highest bit of a tile without it where the tile is 0, or where a
+    # 0 tile below borrowed from it: a highest bit left in `(packed - TILE_ONES) & ~packed` means an empty tile
+    if (packed - TILE_ONES) & ~packed & TILE_EIGHTS:
+        return True
+    if packed & (packed >> 1) & (packed >> 2) & (packed >> 3) & TILE_ONES:
+        # 32768 tiles are not merged, which may keep the other tiles of their row from merging
+        return _table_mergeable(packed)
+    # Identical neighbors leave empty tiles in the XOR of the board with itself shifted by one column (row), where
+    # the tiles of the last column (row) are compared with the next row (nothing) and are made nonzero
+    right = (packed ^ (packed >> 4)) | LAST_COLUMN_ONES
+    lower = (packed ^ (packed >> 16)) | LAST_ROW_ONES
+    return bool(((right - TILE_ONES) & ~right | (lower - TILE_ONES) & ~lower) & TILE_EIGHTS)
+
+
+def _table_mergeable(packed):
+    """Return whether a left or an up move changes a board without empty tiles, looking its rows up"""
+    # Without empty tiles, a left (up) move changes the board iff two neighbors in a row (column) are identical
+    row_left = get_tables()[0]
+    for board in (packed, transpose(packed)):
+        if (row_left[board & ROW_MASK] != board & ROW_MASK or
+                row_left[(board >> 16) & ROW_MASK] != (board >> 16) & ROW_MASK or
+                row_left[(board >> 32) & ROW_MASK] != (board >> 32) & ROW_MASK or
+                row_left[board >> 48] != board >> 48):
+            return True
+    return False
+
+
+def _move_row(row, size, to_right):
+    """Merge a packed row of `size` tiles, return the packed result and the score gained"""
+    tiles = [(row >> (4 * j)) & TILE_MASK for j in range(size)]
+    if to_right:
+        tiles.reverse()
+    merged, score = _merge_row(tiles)
+    # A merge of two 32768 tiles cannot be represented, leave these rows untouched
+    if max(merged) > MAX_EXPONENT:
+        merged, score = tiles, 0
+    if to_right:
+        merged.reverse()
+    result = 0
+    for j, exponent in enumerate(merged):
+        result |= exponent << (4 * j)
+    return result, score
+
+
+def _build_row_tables(size):
+    """Build the left/right row tables and their score tables of rows of `size` tiles"""
+    num_rows = 1 << (4 * size)
+    row_left = array('I', bytes(4 * num_rows))
+    row_right = array('I', bytes(4 * num_rows))
+    score_left = array('I', bytes(4 * num_rows))
+    score_right = array('I', bytes(4 * num_rows))
+    for row in range(num_rows):
+        row_left[row], score_left[row] = _move_row(row, size, False)
+        row_right[row], score_right[row] = _move_row(row, size, True)
+    return row_left, row_right, score_left, score_right
+
+
+class _LazyRowTable(dict):
+    """A row table of wide rows, filled as rows are looked up"""
+
+    def __init__(self, size, to_right, index):
+        super().__init__()
+        self.size = size
+        self.to_right = to_right
+        self.index = index
+
+    def __missing__(self, row):
+        value = self[row] = _move_row(row, self.size, self.to_right)[self.index]
+        return value
+
+
+class BoardShape:
+    """The packed representation of a square board of any size.
+
+    Tiles take 4 bits like on the 64-bit board, row `i` lives in bits `4 * size * i` onwards. The methods mirror
+    the module-level functions of the 4x4 board, e.g. `shape.execute_move(packed, move)` is `execute_move`.
+    Like on the 4x4 board tiles stop at 32768, two 32768 tiles are not merged; play with `Game2048` beyond.
+    Use `board_shape` to get the shape of a size, the 4x4 one calls the module-level functions directly.
+
+    Parameters
+    ----------
+    size : int
+        The number of rows and columns of the board.
+
+    Attributes
+    ----------
+    size : int
+        The number of rows and columns of the board.
+    row_bits : int
+        The number of bits of a packed row.
+    row_mask : int
+        The mask of the lowest packed row.
+    row_shifts : tuple
+        The shift of every packed row.
+    """
+
+    def __init__(self, size):
+        assert size >= 2
+        self.size = size
+        self.row_bits = 4 * size
+        self.row_mask = (1 << self.row_bits) - 1
+        num_tiles = size * size
+        self._threes = int('3' * num_tiles, 16)
+        self._ones = int('1' * num_tiles, 16)
+        self._eights = int('8' * num_tiles, 16)
+        self._last_column_ones = int(('1' + '0' * (size - 1)) * size, 16)
+        self._last_row_ones = int('1' * size + '0' * (num_tiles - size), 16)
+        self.row_shifts = tuple(self.row_bits * i for i in range(size))
+        # Transposes permute the hex digits of the board, the k-th digit holding tile `num_tiles - 1 - k`
+        self._hex_format = '0{}x'.format(num_tiles)
+        self._transpose_digits = itemgetter(*[
+            num_tiles - 1 - (size * ((num_tiles - 1 - k) % size) + (num_tiles - 1 - k) // size)
+            for k in range(num_tiles)])
+        self._tables = None
+
+    def __reduce__(self):
+        # Shapes are shared by the games of a size and hold its tables, only the size is pickled
+        return board_shape, (self.size,)
+
+    def tables(self):
+        """Return the (row_left, row_right, score_left, score_right) tables, loading them on first use"""
+        if self._tables is None:
+            if self.size <= MAX_TABLE_ROW_SIZE:
+                self._tables = load_tables('rows', self.size, lambda: _build_row_tables(self.size),
+                                           ('I', 'I', 'I', 'I'))
+            else:
+                self._tables = (_LazyRowTable(self.size, False, 0), _LazyRowTable(self.size, True, 0),
+                                _LazyRowTable(self.size, False, 1), _LazyRowTable(self.size, True, 1))
+        return self._tables
+
+    def pack(self, board):
+        """Pack a list-of-lists board"""
+        return pack_board(board)
+
+    def unpack(self, packed):
+        """Unpack a packed board into a list-of-lists board"""
+        size = self.size
+        board = []
+        for i in range(size):
+            row = []
+            for j in range(size):
+                exponent = (packed >> (4 * (size * i + j))) & TILE_MASK
+                row.append(1 << exponent if exponent else 0)
+            board.append(row)
+        return board
+
+    def transpose(self, packed):
+        """Transpose a packed board, i.e. swap tile (i, j) with tile (j, i)"""
+        return int(''.join(self._transpose_digits(format(packed, self._hex_format))), 16)
+
+    def _move_rows(self, packed, row_table, score_table):
+        """Apply a row table on all rows"""
+        mask = self.row_mask
+        result = score = 0
+        for shift in self.row_shifts:
+            row = (packed >> shift) & mask
+            result |= row_table[row] << shift
+            score += score_table[row]
+        return result, score
+
+    def execute_move(self, packed, move):
+        """Perform a move on a packed board, see `execute_move`"""
+        row_left, row_right, score_left, score_right = self.tables()
+        if move == 0:
+            return self._move_rows(packed, row_left, score_left)
+        elif move == 1:
+            return self._move_rows(packed, row_right, score_right)
+        elif move == 2:
+            result, score = self._move_rows(self.transpose(packed), row_left, score_left)
+            return self.transpose(result), score
+        elif move == 3:
+            result, score = self._move_rows(self.transpose(packed), row_right, score_right)
+            return self.transpose(result), score
+        return packed, 0
+
+    def legal_moves(self, packed):
+        """Return the moves changing a packed board, see `legal_moves`"""
+        row_left, row_right = self.tables()[:2]
+        mask = self.row_mask
+        moves = []
+        for left, board in ((0, packed), (2, self.transpose(packed))):
+            rows = [(board >> shift) & mask for shift in self.row_shifts]
+            if any(row_left[row] != row for row in rows):
+                moves.append(left)
+            if any(row_right[row] != row for row in rows):
+                moves.append(left + 1)
+        return moves
+
+    def empty_positions(self, packed):
+        """Get coordinates of all empty tiles (in format of [row, col]) in row-major order"""
+        size = self.size
+        return [[idx // size, idx % size] for idx in range(size * size) if not (packed >> (4 * idx)) & TILE_MASK]
+
+    def count_empty(self, packed):
+        """Count the empty tiles on a packed board"""
+        packed |= (packed >> 2) & self._threes
+        packed |= packed >> 1
+        return bin(~packed & self._ones).count('1')
+
+    def random_spawn(self, packed, rng):
+        """Fill a random empty tile with 2 or 4, prob 90% and 10%, respectively, see `random_spawn`"""
+        packed_or = packed | ((packed >> 2) & self._threes)
+        packed_or |= packed_or >> 1
+        nibbles = ~packed_or & self._ones
+        if not nibbles:
+            return packed
+        idx = nth_set_bit(nibbles, rng.randrange(bin(nibbles).count('1')))
+        return packed | ((2 if rng.random() > 0.9 else 1) << idx)
+
+    def is_mergeable(self, packed):
+        """Return whether there exists an empty tile or at least one pair of identical neighbors, see `is_mergeable`"""
+        ones = self._ones
+        if (packed - ones) & ~packed & self._eights:
+            return True
+        if not packed & (packed >> 1) & (packed >> 2) & (packed >> 3) & ones:
+            right = (packed ^ (packed >> 4)) | self._last_column_ones
+            lower = (packed ^ (packed >> self.row_bits)) | self._last_row_ones
+            return bool(((right - ones) & ~right | (lower - ones) & ~lower) & self._eights)
+        row_left = self.tables()[0]
+        mask = self.row_mask
+        for board in (packed, self.transpose(packed)):
+            for shift in self.row_shifts:
+                row = (board >> shift) & mask
+                if row_left[row] != row:
+                    return True
+        return False
+
+
+class _Shape4(BoardShape):
+    """The shape of the 4x4 board, backed by the module-level functions"""
+
+    def __init__(self):
+        super().__init__(BOARD_SIZE)
+
+    tables = staticmethod(get_tables)
+    unpack = staticmethod(unpack_board)
+    transpose = staticmethod(transpose)
+    execute_move = staticmethod(execute_move)
+    legal_moves = staticmethod(legal_moves)
+    empty_positions = staticmethod(empty_positions)
+    count_empty = staticmethod(count_empty)
+    random_spawn = staticmethod(random_spawn)
+    is_mergeable = staticmethod(is_mergeable)
+
+
+@lru_cache(maxsize=None)
+def board_shape(size=BOARD_SIZE):
+    """Return the (shared) `BoardShape` of boards of `size` x `size` tiles"""
+    return _Shape4() if size == BOARD_SIZE else BoardShape(size)
+
+
+class Bitboard2048(Game2048):
+    """The 2048 game backed by a packed 64-bit board.
+
+    It behaves exactly like `Game2048` and exposes the same interface, so agents and testers can switch
+    backends without code changes. `board` and `prev_board` are still readable as list of lists, but they are
+    decoded on every access; use `packed_board` to work with the packed representation directly.
+    Boards larger than 4x4 are packed into wider ints, see `BoardShape`.
+
+    Parameters
+    ----------
+    See `Game2048`.
+
+    Attributes
+    ----------
+    packed_board : int
+        The game board packed into an int, 64 bits for the 4x4 board.
+    shape : BoardShape
+        The operations on packed boards of the size of the game.
+    """
+
+    def __init__(self, task_name='Default_Game', game_mode=True, upper_bound=20, difficulty='simple', seed=None,
+                 rng=None, size=4):
+        self.packed_board = 0
+        self._prev_packed_board = 0
+        self.shape = board_shape(size)
+        super().__init__(task_name, game_mode, upper_bound, difficulty, seed, rng, size)
+
+    def state_key(self):
+        """Return a compact int identifying the board and the player to move"""
+        return (self.packed_board << 1) | (self._active_player == Game2048.computer)
+
+    @property
+    def board(self):
+        """The game board in form of list of lists"""
+        return self.shape.unpack(self.packed_board)
+
+    @board.setter
+    def board(self, board):
+        self.packed_board = pack_board(board)
+
+    @property
+    def prev_board(self):
+        """The game board before the last move in form of list of lists"""
+        return self.shape.unpack(self._prev_packed_board)
+
+    @prev_board.setter
+    def prev_board(self, board):
+        self._prev_packed_board = pack_board(board)
+
+    def copy(self):
+        """Return a copy of the current game state"""
+        new_game = self.__class__.__new__(self.__class__)
+        new_game.__dict__.update(self.__dict__)
+        return new_game
+
+    def empty_tiles(self):
+        """Get coordinates of all empty tiles(in format of [row, col])"""
+        return self.shape.empty_positions(self.packed_board)
+
+    def get_num_empty_tiles(self):
+        """Get the number of empty tiles remain on the board"""
+        return self.shape.count_empty(self.packed_board)
+
+    def moves_available(self):
+        """Get available moves under the current game state"""
+        return self.shape.legal_moves(self.packed_board)
+
+    def can_move(self, move):
+        """Return whether the given move changes the board, without performing it"""
+        return self.shape.execute_move(self.packed_board, move)[0] != self.packed_board
+
+    def children(self):
+        """Get the agent's legal moves together with the resulting games in one pass
+
+        Every move is executed once and its result is reused for the child, see `Game2048.children`.
+        """
+        board = self.packed_board
+        shape = self.shape
+        children = []
+        for move in self._moves:
+            result, score = shape.execute_move(board, move)
+            if result != board:
+                child = self.copy()
+                child._prev_packed_board = board
+                child.packed_board = result
+                child._add_score(score)
+                child.end = not shape.is_mergeable(result)
+                child.switch_player()
+                if child.game_mode:
+                    child._fill_random_empty_tile()
+                    child.switch_player()
+                children.append((move, child, score))
+        return children
+
+    def _set_tile(self, i, j, value):
+        """Set the tile at row `i` and column `j` to the given (non-zero) value"""
+        shift = 4 * (self.size * i + j)
+        self.packed_board = (self.packed_board & ~(TILE_MASK << shift)) | ((value.bit_length() - 1) << shift)
+
+    def _fill_random_empty_tile(self):
+        """Randomly fill an empty tile with 2 or 4, prob 90% and 10%, respectively, see `random_spawn`"""
+        self.packed_board = self.shape.random_spawn(self.packed_board, self.rng)
+
+    def fill_specific_empty_tile(self, tile, value=None):
+        """Fill the given tile, with `value` if given, otherwise according to the difficulty"""
+        if tile:
+            i, j = tile
+            if value is not None:
+                self._set_tile(i, j, value)
+            elif self.difficulty == 'simple':
+                self._set_tile(i, j, 2)
+            else:
+                self._set_tile(i, j, 4 if self.rng.random() > 0.9 else 2)
+
+    def _is_mergeable(self):
+        """Return whether there exists an empty tile or at least one pair of tiles is mergeable"""
+        return self.shape.is_mergeable(self.packed_board)
+
+    def is_lost(self):
+        """Return True if the game is ended"""
+        return not self.shape.is_mergeable(self.packed_board)
+
+    def perform_move(self, move=None):
+        """Perform a move on the game board"""
+        self._prev_packed_board = self.packed_board
+
+        if self._active_player == Game2048.computer and self.shape.count_empty(self.packed_board) > 0:
+            self._fill_random_empty_tile()
+        else:
+            # 0 for LEFT, 1 for RIGHT, 2 for UP, 3 for DOWN
+            self.packed_board, score = self.shape.execute_move(self.packed_board, move)
+            self._add_score(score)
+
+        self.end = not self._is_mergeable()
+        self.switch_player()
+
+        changed = self._prev_packed_board != self.packed_board
+        # Fill an empty tile if this merge changes the game state
+        if self.game_mode and changed:
+            self._fill_random_empty_tile()
+            self.switch_player()
+
+        return changed
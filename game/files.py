@@ -0,0 +1,25 @@
+"""File helpers shared by the modules saving tables, weights and checkpoints."""
+
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode='wb'):
+    """Open a temporary file which replaces `path` once written, so that readers and crashes never see a partial file
+
+    The temporary file is created next to `path` (`os.replace` is only atomic within a file system), flushed and
+    synced to disk before replacing `path`, and removed if writing fails.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
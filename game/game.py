@@ -7,8 +7,6 @@
 # Last Updated: July 3, 2017
 
 import sys
-import csv
-import copy
 import random
 from functools import reduce
 
@@ -26,35 +24,56 @@ class Game2048:
         This value will be used for generating a mapping for beautiful print of game boards.
         If 20, we will generate a map(dict) contains key-value pair from '2': '2' to '524288': '524288'.
         This value has to be greater than 10 in order to have a minimal map for a 2048 game.
+    seed : int, optional (default=None)
+        The seed of the random generator of the game. If None (and no `rng` is given), a seed is drawn from the
+        global `random` module, so that runs seeded globally stay reproducible.
+    rng : random.Random, optional (default=None)
+        The random generator used for spawns, instead of a new generator seeded with `seed`.
+    size : int, optional (default=4)
+        The number of rows and columns of the game board.
 
     Attributes
     ----------
+    size : int
+        The number of rows and columns of the game board.
     row : int
         The number of rows for the game board.
     col : int
         The number of columns for the game board.
     board : list of lists
-        The game board in form of [[row1], [row2], [row3], [row4]] with `row` is set to 4.
+        The game board in form of [[row1], [row2], [row3], [row4]] with `row` is set to 4 (`size` in general).
     score : int
         The game score.
     end : bool
         Whether the game is ended.
     task_name : str
         The filename of the file where we store the game info
+    seed : int or None
+        The seed of the random generator of the game, saved with the game info. None if an `rng` was given.
+    rng : random.Random
+        The random generator used for spawns. Copies of the game share it.
     """
     agent = 'Agent'
     computer = 'Computer'
+    _mappings = {}
 
-    def __init__(self, task_name='Default_Game', game_mode=True, upper_bound=20, difficulty='simple'):
+    def __init__(self, task_name='Default_Game', game_mode=True, upper_bound=20, difficulty='simple', seed=None,
+                 rng=None, size=4):
         assert upper_bound > 10
-        self.row = 4
-        self.col = 4
+        assert size >= 2
+        self.size = size
+        self.row = size
+        self.col = size
         self.board = self._generate_board()
         self.score = 0
         self.end = False
         self.task_name = task_name
         self.game_mode = game_mode
         self.difficulty = difficulty
+        if rng is None and seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = rng if rng is not None else random.Random(seed)
         self._moves = [0, 1, 2, 3]
         self._player_1 = Game2048.agent
         self._player_2 = Game2048.computer
@@ -64,10 +83,22 @@ class Game2048:
         self._fill_random_empty_tile()
         self._fill_random_empty_tile()
         # NOTE: Save the previous board **HERE** instead of the previous position
-        self.prev_board = copy.deepcopy(self.board)
+        self.prev_board = [row[:] for row in self.board]
 
     def __hash__(self):
-        return str(self.board).__hash__()
+        return hash(self.state_key())
+
+    def state_key(self):
+        """Return a compact int identifying the board and the player to move
+
+        Every tile takes 5 bits holding the bit length of its value (0 for an empty tile), the lowest bit
+        is set when it is the computer's turn.
+        """
+        key = 0
+        for row in self.board:
+            for tile in row:
+                key = (key << 5) | tile.bit_length()
+        return (key << 1) | (self._active_player == Game2048.computer)
 
     @property
     def active_player(self):
@@ -88,19 +119,15 @@ class Game2048:
         return self._active_player if player == self._inactive_player else self._inactive_player
 
     def copy(self):
-        """Return a deep copy of the current game state"""
-        new_game = Game2048(self.task_name)
-        new_game.row = self.row
-        new_game.col = self.col
-        new_game.prev_board = copy.deepcopy(self.prev_board)
-        new_game.board = copy.deepcopy(self.board)
-        new_game.game_mode = self.game_mode
-        new_game.difficulty = self.difficulty
-        new_game.score = self.score
-        new_game.end = self.end
-        new_game.task_name = self.task_name
-        new_game._active_player = self._active_player
-        new_game._inactive_player = self._inactive_player
+        """Return a copy of the current game state
+
+        The constructor is bypassed on purpose: search agents copy a game for every node they expand, and
+        generating the print mapping and filling two random tiles only to throw them away is wasted work.
+        """
+        new_game = self.__class__.__new__(self.__class__)
+        new_game.__dict__.update(self.__dict__)
+        new_game.board = [row[:] for row in self.board]
+        new_game.prev_board = [row[:] for row in self.prev_board]
 
         return new_game
 
@@ -117,10 +144,12 @@ class Game2048:
         return [[0 for _ in range(self.col)] for _ in range(self.row)]
 
     def _generate_mapping(self, upper_bound):
-        """Generate a game value map for printing."""
+        """Generate a game value map for printing, shared by all games with the same upper bound."""
         # TODO: support customized mapping (not a feature for AI)
-        mapping = {str(2 ** power): str(2 ** power) for power in range(1, upper_bound)}
-        return reduce(lambda x, y: dict(x, **y), ({'0': '0'}, mapping))
+        if upper_bound not in Game2048._mappings:
+            mapping = {str(2 ** power): str(2 ** power) for power in range(1, upper_bound)}
+            Game2048._mappings[upper_bound] = reduce(lambda x, y: dict(x, **y), ({'0': '0'}, mapping))
+        return Game2048._mappings[upper_bound]
 
     def empty_tiles(self):
         """Get coordinates of all empty tiles(in format of [col, row])"""
@@ -134,74 +163,106 @@ class Game2048:
 
     def moves_available(self):
         """Get available moves under the current game state"""
-        available = []
+        return [move for move in self._moves if self.can_move(move)]
+
+    def can_move(self, move):
+        """Return whether the given move changes the board, without performing it
+
+        A row/column changes when a tile can slide into an empty tile or when two neighbors are identical.
+        """
+        board = self.board
+        # 0 for LEFT, 1 for RIGHT, 2 for UP, 3 for DOWN
+        if move == 0 or move == 1:
+            for r in board:
+                for j in range(self.col - 1):
+                    a, b = (r[j], r[j + 1]) if move == 0 else (r[j + 1], r[j])
+                    if (a == 0 and b != 0) or (a != 0 and a == b):
+                        return True
+        elif move == 2 or move == 3:
+            for i in range(self.row - 1):
+                r, next_r = board[i], board[i + 1]
+                for j in range(self.col):
+                    a, b = (r[j], next_r[j]) if move == 2 else (next_r[j], r[j])
+                    if (a == 0 and b != 0) or (a != 0 and a == b):
+                        return True
+        return False
+
+    def children(self):
+        """Get the agent's legal moves together with the resulting games in one pass
+
+        Return
+        ----------
+        list
+            A list of (move, game, score) tuples where `game` is a copy of this game after performing `move`
+            and `score` is the score gained by the merges of the move.
+        """
+        children = []
         for move in self._moves:
-            grid_copy = self.copy()
-            changed = grid_copy.perform_move(move)
-            if changed:
-                available.append(move)
-        return available
+            if self.can_move(move):
+                child = self.copy()
+                child.perform_move(move)
+                children.append((move, child, child.score - self.score))
+        return children
 
     def _fill_random_empty_tile(self):
-        """Randomly fill an empty tile with 2 or 4, prob 90% and 10%, respectively"""
-        empty_tiles = self.empty_tiles()
-        if empty_tiles:
-            [i, j] = random.choice(empty_tiles)
-            self.board[i][j] = 4 if random.random() > 0.9 else 2
-
-    def fill_specific_empty_tile(self, tile):
-        """Fill the given tile"""
+        """Randomly fill an empty tile with 2 or 4, prob 90% and 10%, respectively
+
+        The n-th empty tile in row-major order is picked without building the list of empty tiles, drawing the
+        same random numbers as `random.choice(self.empty_tiles())` would.
+        """
+        num_empty = sum(row.count(0) for row in self.board)
+        if num_empty:
+            n = self.rng.randrange(num_empty)
+            for row in self.board:
+                empty_in_row = row.count(0)
+                if n < empty_in_row:
+                    j = -1
+                    for _ in range(n + 1):
+                        j = row.index(0, j + 1)
+                    row[j] = 4 if self.rng.random() > 0.9 else 2
+                    return
+                n -= empty_in_row
+
+    def spawn(self, tile, value=2):
+        """Return a copy of the game after the computer fills the given empty tile with `value`
+
+        It is the `GameState.spawn` of games which cannot be packed into a state (tiles beyond 32768).
+        """
+        child = self.copy()
+        child.fill_specific_empty_tile(tile, value)
+        child.switch_player()
+        return child
+
+    def fill_specific_empty_tile(self, tile, value=None):
+        """Fill the given tile, with `value` if given, otherwise according to the difficulty"""
         if tile:
             i, j = tile
-            if self.difficulty == 'simple':
+            if value is not None:
+                self.board[i][j] = value
+            elif self.difficulty == 'simple':
                 self.board[i][j] = 2
             else:
-                self.board[i][j] = 4 if random.random() > 0.9 else 2
+                self.board[i][j] = 4 if self.rng.random() > 0.9 else 2
 
     def _is_mergeable(self):
-        """Return whether there exists at least one pair of tiles is mergeable"""
-
-        def is_adjacent_equal(arr):
-            """Return whether there exists adjacent tiles have an identical value"""
-            if len(arr) is 1:
+        """Return whether there exists an empty tile or at least one pair of tiles is mergeable"""
+        board = self.board
+        for r in board:
+            if 0 in r:
                 return True
 
-            for idx in range(len(arr) - 1):
-                if arr[idx] == arr[idx + 1]:
+        # Without empty tiles, a pair is mergeable only when it is made of identical neighbors
+        for r in board:
+            for j in range(self.col - 1):
+                if r[j] == r[j + 1]:
                     return True
-
-            return False
-
-        def check_all_rows_mergeable():
-            """Check mergebility for each row"""
-            for row_idx in range(self.row):
-                row = []
-                for i in self.board[row_idx]:
-                    if i != 0:
-                        row.append(i)
-
-                if is_adjacent_equal(row):
+        for i in range(self.row - 1):
+            r, next_r = board[i], board[i + 1]
+            for j in range(self.col):
+                if r[j] == next_r[j]:
                     return True
 
-            return False
-
-        def check_all_columns_mergeable():
-            """Check mergebility for each column"""
-            for col_idx in range(self.col):
-                col = []
-                for i in self.board:
-                    if i[col_idx] != 0:
-                        col.append(i[col_idx])
-
-                if is_adjacent_equal(col):
-                    return True
-
-            return False
-
-        if self.get_num_empty_tiles() != 0:
-            return True
-
-        return check_all_rows_mergeable() or check_all_columns_mergeable()
+        return False
 
     def _merge(self, arr, direction):
         """Merge tiles in rows and columns by given direction
@@ -233,7 +294,7 @@ class Game2048:
         squeeze()
 
         # If there is only 1 non-zero tiles, no need to do further work
-        if len(store) is 1:
+        if len(store) == 1:
             result = [0 for _ in range(len(arr))]
             # To the left/top
             if direction:
@@ -247,8 +308,8 @@ class Game2048:
         if not direction:
             store = store[::-1]
         # Handle special cases where we have [A, A, B, B] in a row/column
-        # A and B could be identical
-        if len(store) is 4 and store[0] == store[1] and store[2] == store[3]:
+        # A and B could be identical, and on larger boards this applies to any row/column holding 4 tiles
+        if len(store) == 4 and store[0] == store[1] and store[2] == store[3]:
             store = [store[0] * 2, store[2] * 2]
         else:
             # Merge identical neighbors
@@ -262,7 +323,7 @@ class Game2048:
         # Reverse it back if we are performing a right/downward merge
         if not direction:
             store = store[::-1]
-        # Keep a length of 4 for a row/column
+        # Keep the length of the row/column
         while len(store) < len(arr):
             store.append(0) if direction else store.insert(0, 0)
 
@@ -293,7 +354,7 @@ class Game2048:
 
     def perform_move(self, move=None):
         """Perform a move on the game board"""
-        self.prev_board = copy.deepcopy(self.board)
+        self.prev_board = [row[:] for row in self.board]
 
         if self._active_player == 'Computer' and len(self.empty_tiles()) > 0:
             self._fill_random_empty_tile()
@@ -319,15 +380,29 @@ class Game2048:
 
         return changed
 
-    def save_game_info(self, step=None, time_cost=None):
-        """Save the game info we need for further statistics"""
+    def game_info(self, step=None, time_cost=None):
+        """Return the game info we need for further statistics, i.e. a row of the result CSV
+
+        The row is [score, best_tile, step, time_cost, seed], the seed allows to replay the spawns of the game.
+        """
         tiles = [item for sublist in self.board for item in sublist]
         best_tile = max(tiles)
-        with open('{}.csv'.format(self.task_name), 'a', newline='\n') as f:
-            writer = csv.writer(f)
-            writer.writerow([self.score, best_tile, step, time_cost])
+        return [self.score, best_tile, step, time_cost, self.seed]
+
+    def save_game_info(self, step=None, time_cost=None):
+        """Save the game info we need for further statistics
+
+        Rows are buffered by the result sink of the task and appended in batches (and at exit),
+        see `game.results.ResultSink`.
+        """
+        # Imported here so that importing the game package does not import `game.results`, which is also run as
+        # a script (python -m game.results)
+        from .results import get_sink
+
+        info = self.game_info(step, time_cost)
+        get_sink(self.task_name).write(info)
 
-        return self.score, best_tile
+        return info[0], info[1]
 
     def is_lost(self):
         """Return True if the game is ended"""
@@ -0,0 +1,248 @@
+"""Buffered writing and fast reading of game results.
+
+`ResultSink` collects result rows in memory and appends them in batches, to the usual CSV and optionally to
+a compact columnar binary file, instead of opening the CSV for every game. Batches are appended under a file
+lock, so several threads or processes can share a result file without interleaving partial rows.
+
+New CSVs start with a header naming the `COLUMNS`. Existing CSVs are only appended to, never rewritten: rows
+of older files may lack the last columns (e.g. the seed), which `load_csv` reads as missing values.
+
+`load_results` reads both formats (including the existing `results/*.csv` files) into columns of typed arrays
+and `summarize` computes the win rate and the tile distribution from them.
+
+Usage: python -m game.results results/minimax.csv [more result files]
+"""
+
+import atexit
+import csv
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Windows, batches are still written with a single call
+    fcntl = None
+
+# Result columns and their array type codes, new columns must be appended at the end
+COLUMNS = (('score', 'q'), ('best_tile', 'q'), ('step', 'q'), ('time_cost', 'd'), ('seed', 'q'))
+CSV_HEADER = ','.join(name for name, _ in COLUMNS) + '\r\n'
+BLOCK_MAGIC = b'R2K1'
+BLOCK_HEADER = struct.Struct('<4sII')
+# Stand-ins for missing values in the binary format
+MISSING_INT = -1
+MISSING_FLOAT = float('nan')
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def _locked_append(path, data, mode):
+    """Append data to a file with a single write, under an exclusive lock when available"""
+    with open(path, mode, **({} if 'b' in mode else {'newline': ''})) as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(data)
+            f.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _is_data_row(line):
+    """Return whether a CSV line is a result row rather than a header"""
+    return line.split(',', 1)[0].lstrip('-').isdigit()
+
+
+def _append_csv_rows(path, data):
+    """Append CSV lines to a result CSV under an exclusive lock, starting new (or empty) files with the header"""
+    with open(path, 'a', newline='') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                data = CSV_HEADER + data
+            f.write(data)
+            f.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ResultSink:
+    """Buffer result rows and append them in batches.
+
+    Parameters
+    ----------
+    task_name : str
+        Rows are appended to '{task_name}.csv', and to '{task_name}.bin' if `columnar` is True.
+    batch_size : int, optional (default=100)
+        The number of buffered rows which triggers a flush.
+    flush_interval : float, optional (default=30.)
+        The number of seconds after which a write triggers a flush, so slow runs still save regularly.
+    columnar : bool, optional (default=False)
+        Whether rows are also appended to the columnar binary file.
+    """
+
+    def __init__(self, task_name, batch_size=100, flush_interval=30., columnar=False):
+        self.task_name = task_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.columnar = columnar
+        self._rows = []
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        atexit.register(self.flush)
+
+    def write(self, row):
+        """Buffer one row in form of [score, best_tile, step, time_cost, seed]"""
+        self.write_many([row])
+
+    def write_many(self, rows):
+        """Buffer several rows"""
+        with self._lock:
+            self._rows.extend(list(row) for row in rows)
+            due = (len(self._rows) >= self.batch_size or
+                   time.time() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the result file(s)"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._last_flush = time.time()
+            if not rows:
+                return
+            self._append_csv(rows)
+            if self.columnar:
+                self._append_columnar(rows)
+
+    def close(self):
+        """Flush the buffered rows"""
+        self.flush()
+
+    def _append_csv(self, rows):
+        """Append rows to the CSV with one write"""
+        lines = []
+        writer = csv.writer(_LineCollector(lines))
+        writer.writerows(rows)
+        _append_csv_rows('{}.csv'.format(self.task_name), ''.join(lines))
+
+    def _append_columnar(self, rows):
+        """Append rows to the binary file as one block of columns"""
+        data = [BLOCK_HEADER.pack(BLOCK_MAGIC, len(rows), len(COLUMNS))]
+        for idx, (_, typecode) in enumerate(COLUMNS):
+            missing = MISSING_FLOAT if typecode == 'd' else MISSING_INT
+            column = array(typecode, (row[idx] if idx < len(row) and row[idx] is not None else missing
+                                      for row in rows))
+            data.append(column.tobytes())
+        _locked_append('{}.bin'.format(self.task_name), b''.join(data), 'ab')
+
+
+class _LineCollector:
+    """A file-like object collecting what a csv writer writes"""
+
+    def __init__(self, lines):
+        self.write = lines.append
+
+
+def get_sink(task_name, **kwargs):
+    """Return the sink of a task in this process, creating it on first use"""
+    with _sinks_lock:
+        if task_name not in _sinks:
+            _sinks[task_name] = ResultSink(task_name, **kwargs)
+        return _sinks[task_name]
+
+
+def flush_all():
+    """Flush the sinks of every task in this process"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.flush()
+
+
+def _empty_columns():
+    """Return one empty typed array per column"""
+    return {name: array(typecode) for name, typecode in COLUMNS}
+
+
+def load_csv(path):
+    """Load a result CSV into columns, values missing from a row (e.g. `step` in old files) are MISSING_*"""
+    columns = _empty_columns()
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if not row:
+                continue
+            if not _is_data_row(row[0]):
+                # Header
+                continue
+            for idx, (name, typecode) in enumerate(COLUMNS):
+                value = row[idx] if idx < len(row) else ''
+                if typecode == 'd':
+                    columns[name].append(float(value) if value else MISSING_FLOAT)
+                else:
+                    columns[name].append(int(value) if value else MISSING_INT)
+    return columns
+
+
+def load_columnar(path):
+    """Load a columnar binary result file"""
+    columns = _empty_columns()
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        magic, num_rows, num_columns = BLOCK_HEADER.unpack_from(data, offset)
+        if magic != BLOCK_MAGIC:
+            raise ValueError('Corrupted result file {} at offset {}'.format(path, offset))
+        offset += BLOCK_HEADER.size
+        for name, typecode in COLUMNS[:num_columns]:
+            column = array(typecode)
+            size = num_rows * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            columns[name].extend(column)
+            offset += size
+    return columns
+
+
+def load_results(path):
+    """Load a result file, binary if it ends with '.bin', CSV otherwise"""
+    return load_columnar(path) if path.endswith('.bin') else load_csv(path)
+
+
+def summarize(columns, win_tile=2048):
+    """Compute the number of games, the win rate, score stats and the best tile distribution"""
+    scores = columns['score']
+    best_tiles = columns['best_tile']
+    games = len(scores)
+    distribution = {}
+    for tile in best_tiles:
+        distribution[tile] = distribution.get(tile, 0) + 1
+    wins = sum(count for tile, count in distribution.items() if tile >= win_tile)
+    times = [t for t in columns['time_cost'] if not math.isnan(t)]
+    return {
+        'games': games,
+        'win_rate': wins / games if games else 0.,
+        'mean_score': sum(scores) / games if games else 0.,
+        'max_score': max(scores) if games else 0,
+        'mean_time_cost': sum(times) / len(times) if times else None,
+        'tile_distribution': dict(sorted(distribution.items())),
+    }
+
+
+if __name__ == '__main__':
+    for result_path in sys.argv[1:]:
+        summary = summarize(load_results(result_path))
+        print('{}: {} games, win rate {:.2%}, mean score {:.1f}, max score {}'.format(
+            os.path.basename(result_path), summary['games'], summary['win_rate'], summary['mean_score'],
+            summary['max_score']))
+        print('    best tiles: {}'.format(', '.join('{}: {}'.format(tile, count) for tile, count in
+                                                     summary['tile_distribution'].items())))
@@ -0,0 +1,180 @@
+"""A compact, immutable game state for search.
+
+`Game2048` carries everything needed to play, print and save a game. Search trees only need the board,
+the score and whose turn it is, so agents search over `GameState` values instead: a tuple subclass without
+instance dict holding a packed board (see `game.bitboard`), the score and the side to move. States of boards
+larger than 4x4 are `SizedGameState` values, which also hold the board size.
+"""
+
+from operator import itemgetter
+
+from .bitboard import BOARD_SIZE, TILE_MASK, board_shape, count_empty, empty_positions, execute_move, \
+    is_mergeable, legal_moves, packed_board_of, unpack_board
+from .game import Game2048
+
+MOVES = (0, 1, 2, 3)
+
+
+class GameState(tuple):
+    """An immutable, hashable (packed_board, score, agent_to_move) triple.
+
+    It exposes the part of the `Game2048` interface used by search agents (`active_player`, `state_key`,
+    `is_lost`, `moves_available`, `children`, `empty_tiles`, `get_num_empty_tiles` and `board`), but moves
+    return new states instead of modifying the current one. The computer's move is `spawn`.
+
+    Parameters
+    ----------
+    packed_board : int
+        The game board packed into a 64-bit int.
+    score : int, optional (default=0)
+        The game score.
+    agent_to_move : bool, optional (default=True)
+        Whether it is the agent's turn, otherwise it is the computer's turn to spawn a tile.
+    """
+    __slots__ = ()
+
+    packed_board = property(itemgetter(0), doc='The game board packed into a 64-bit int')
+    score = property(itemgetter(1), doc='The game score')
+    agent_to_move = property(itemgetter(2), doc='Whether it is the agent\'s turn')
+    size = BOARD_SIZE
+
+    def __new__(cls, packed_board, score=0, agent_to_move=True):
+        return tuple.__new__(cls, (packed_board, score, agent_to_move))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __repr__(self):
+        return 'GameState(packed_board={:#018x}, score={}, agent_to_move={})'.format(*self)
+
+    @classmethod
+    def from_game(cls, game):
+        """Build the state of a game of any backend and size"""
+        size = getattr(game, 'size', BOARD_SIZE)
+        if size != BOARD_SIZE:
+            return SizedGameState(packed_board_of(game), game.score, game.active_player == Game2048.agent, size)
+        return cls(packed_board_of(game), game.score, game.active_player == Game2048.agent)
+
+    @property
+    def active_player(self):
+        """The player that plays on this turn"""
+        return Game2048.agent if self[2] else Game2048.computer
+
+    @property
+    def board(self):
+        """The game board in form of list of lists"""
+        return unpack_board(self[0])
+
+    def state_key(self):
+        """Return a compact int identifying the board and the player to move, like `Bitboard2048.state_key`"""
+        return (self[0] << 1) | (not self[2])
+
+    def is_lost(self):
+        """Return True if the game is ended"""
+        return not is_mergeable(self[0])
+
+    def moves_available(self):
+        """Get available moves under the current game state"""
+        return legal_moves(self[0])
+
+    def children(self):
+        """Get the agent's legal moves together with the resulting states and merge scores
+
+        Return
+        ----------
+        list
+            A list of (move, state, score) tuples, see `Game2048.children`.
+        """
+        board, score, _ = self
+        children = []
+        for move in MOVES:
+            result, gained = execute_move(board, move)
+            if result != board:
+                children.append((move, tuple.__new__(GameState, (result, score + gained, False)), gained))
+        return children
+
+    def empty_tiles(self):
+        """Get coordinates of all empty tiles(in format of [row, col])"""
+        return empty_positions(self[0])
+
+    def get_num_empty_tiles(self):
+        """Get the number of empty tiles remain on the board"""
+        return count_empty(self[0])
+
+    def spawn(self, tile, value=2):
+        """Return the state after the computer fills the given empty tile with `value`"""
+        i, j = tile
+        shift = 16 * i + 4 * j
+        board = (self[0] & ~(TILE_MASK << shift)) | ((value.bit_length() - 1) << shift)
+        return tuple.__new__(GameState, (board, self[1], True))
+
+
+class SizedGameState(GameState):
+    """An immutable, hashable (packed_board, score, agent_to_move, size) state of a board of any size.
+
+    It behaves like `GameState`, the board being packed as described by `game.bitboard.BoardShape`.
+
+    Parameters
+    ----------
+    packed_board : int
+        The packed game board.
+    score : int, optional (default=0)
+        The game score.
+    agent_to_move : bool, optional (default=True)
+        Whether it is the agent's turn, otherwise it is the computer's turn to spawn a tile.
+    size : int, optional (default=4)
+        The number of rows and columns of the board.
+    """
+    __slots__ = ()
+
+    size = property(itemgetter(3), doc='The number of rows and columns of the board')
+
+    def __new__(cls, packed_board, score=0, agent_to_move=True, size=BOARD_SIZE):
+        return tuple.__new__(cls, (packed_board, score, agent_to_move, size))
+
+    def __repr__(self):
+        return 'SizedGameState(packed_board={:#x}, score={}, agent_to_move={}, size={})'.format(*self)
+
+    @property
+    def shape(self):
+        """The operations on packed boards of this size"""
+        return board_shape(self[3])
+
+    @property
+    def board(self):
+        """The game board in form of list of lists"""
+        return self.shape.unpack(self[0])
+
+    def is_lost(self):
+        """Return True if the game is ended"""
+        return not self.shape.is_mergeable(self[0])
+
+    def moves_available(self):
+        """Get available moves under the current game state"""
+        return self.shape.legal_moves(self[0])
+
+    def children(self):
+        """Get the agent's legal moves together with the resulting states and merge scores, see `GameState`"""
+        board, score, _, size = self
+        execute = board_shape(size).execute_move
+        children = []
+        for move in MOVES:
+            result, gained = execute(board, move)
+            if result != board:
+                children.append((move, tuple.__new__(SizedGameState, (result, score + gained, False, size)), gained))
+        return children
+
+    def empty_tiles(self):
+        """Get coordinates of all empty tiles(in format of [row, col])"""
+        return self.shape.empty_positions(self[0])
+
+    def get_num_empty_tiles(self):
+        """Get the number of empty tiles remain on the board"""
+        return self.shape.count_empty(self[0])
+
+    def spawn(self, tile, value=2):
+        """Return the state after the computer fills the given empty tile with `value`"""
+        i, j = tile
+        shift = 4 * (self[3] * i + j)
+        board = (self[0] & ~(TILE_MASK << shift)) | ((value.bit_length() - 1) << shift)
+        return tuple.__new__(SizedGameState, (board, self[1], True, self[3]))
@@ -0,0 +1,136 @@
+"""A cache of precomputed lookup tables in binary files, memory-mapped on first use.
+
+Building the 65536-entry row tables of the bitboard engine and of the table-driven evaluation takes about a
+second of pure Python, paid again by every worker process. `load_tables` builds the tables of a configuration
+once, saves them to '{name}-{digest}.tables' in the cache directory and memory-maps that file afterwards. The
+digest covers `TABLES_VERSION` and the configuration key (e.g. the heuristic weights and weight matrix), so
+tables built with other weights, or by an older version of the code, are never picked up.
+
+The cache directory is `$GAME2048_TABLE_DIR` if set, '~/.cache/endless-2048' otherwise.
+
+File layout (little-endian): a `HEADER` (magic, number of tables), one `ENTRY` (array type code, length) per
+table, then the data of every table, each padded to a multiple of 8 bytes.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from .files import atomic_open
+
+# Bump when the code building any table changes, so that cached files are rebuilt
+TABLES_VERSION = 1
+CACHE_DIR_ENV = 'GAME2048_TABLE_DIR'
+MAGIC = b'T2K1'
+HEADER = struct.Struct('<4sI')
+ENTRY = struct.Struct('<cxxxI')
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def cache_dir():
+    """Return the directory of the table files"""
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'endless-2048')
+
+
+def table_path(name, key):
+    """Return the path of the file caching the tables `name` built for the configuration `key`"""
+    digest = hashlib.sha1(repr((TABLES_VERSION, name, key)).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir(), '{}-{}.tables'.format(name, digest))
+
+
+def _padding(size):
+    """Return the number of bytes padding `size` to a multiple of 8"""
+    return -size % 8
+
+
+def to_arrays(tables, typecodes=None):
+    """Convert lists of numbers to typed arrays, inferring 'q' (all ints) or 'd' where no type code is given"""
+    arrays = []
+    for idx, table in enumerate(tables):
+        typecode = typecodes[idx] if typecodes else None
+        if typecode is None:
+            typecode = 'q' if all(isinstance(value, int) for value in table) else 'd'
+        arrays.append(array(typecode, table))
+    return arrays
+
+
+def save_tables(path, arrays):
+    """Write typed arrays to a table file, atomically so that concurrent workers never read a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    data = [HEADER.pack(MAGIC, len(arrays))]
+    data.extend(ENTRY.pack(table.typecode.encode(), len(table)) for table in arrays)
+    for table in arrays:
+        raw = table.tobytes()
+        data.append(raw + b'\0' * _padding(len(raw)))
+    with atomic_open(path) as f:
+        f.write(b''.join(data))
+
+
+def map_tables(path):
+    """Memory-map a table file and return its tables as memoryviews
+
+    Raises ValueError if the file is not a valid table file.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < HEADER.size:
+        raise ValueError('Truncated table file {}'.format(path))
+    magic, num_tables = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('Not a table file: {}'.format(path))
+
+    view = memoryview(buffer)
+    offset = HEADER.size + num_tables * ENTRY.size
+    tables = []
+    for idx in range(num_tables):
+        typecode, length = ENTRY.unpack_from(buffer, HEADER.size + idx * ENTRY.size)
+        typecode = typecode.decode()
+        size = length * array(typecode).itemsize
+        if offset + size > len(buffer):
+            raise ValueError('Truncated table file {}'.format(path))
+        tables.append(view[offset:offset + size].cast(typecode))
+        offset += size + _padding(size)
+    return tables
+
+
+def load_tables(name, key, build, typecodes=None):
+    """Return the tables `name` of a configuration, building and caching them on first use
+
+    Parameters
+    ----------
+    name : str
+        The name of the group of tables, e.g. 'bitboard'.
+    key : object
+        A configuration key with a stable repr, identifying what the tables are built from.
+    build : callable
+        Called without argument to build the tables, it returns a list of lists of numbers.
+    typecodes : sequence, optional (default=None)
+        The array type code of each table, see `to_arrays`.
+
+    Return
+    ----------
+    list
+        One memoryview per table, mapped from the cache file and shared with the other processes mapping
+        it. Typed arrays are returned instead if the cache directory cannot be written.
+    """
+    path = table_path(name, key)
+    with _lock:
+        if path in _loaded:
+            return _loaded[path]
+        try:
+            tables = map_tables(path)
+        except (OSError, ValueError):
+            arrays = to_arrays(build(), typecodes)
+            try:
+                save_tables(path, arrays)
+                tables = map_tables(path)
+            except OSError:
+                tables = arrays
+        _loaded[path] = tables
+        return tables
@@ -0,0 +1,237 @@
+"""Compact recording of whole games and a memory-mapped store to replay and sample them.
+
+A trajectory store is made of two files of fixed-width little-endian records:
+
+- '{path}.steps' holds one `STEP` record per agent move: the packed board before the move, the move, the
+  position and exponent of the tile spawned after it, and the score gained by the move.
+- '{path}.games' holds one `GAME` record per game: its seed, the index of its first step, its initial and final
+  packed boards, its number of steps and its final score.
+
+Since every spawn is stored, any game can be replayed exactly from its initial board, whatever the random state
+it was played with. Records are read straight from the memory-mapped files, so sampling steps across millions
+of games does not load the store into Python objects.
+
+Usage: python -m game.trajectory results/minimax_trajectories
+"""
+
+import mmap
+import os
+import random
+import struct
+import sys
+
+from .bitboard import BOARD_SIZE, TILE_MASK, execute_move, packed_board_of
+
+try:
+    import fcntl
+except ImportError:  # Windows, games are still written with a single call per file
+    fcntl = None
+
+# board, move, spawn position, spawn exponent, padding, reward
+STEP = struct.Struct('<QBBBxI')
+# seed, first step, initial board, final board, number of steps, score
+GAME = struct.Struct('<QQQQII')
+# Spawn position of a move followed by no spawn
+NO_SPAWN = 0xFF
+# Seed of a game played without a known seed
+NO_SEED = 2 ** 64 - 1
+
+
+def find_spawn(before, after):
+    """Return the (position, exponent) of the tile spawned between two packed boards
+
+    Positions are tile indexes in row-major order, (NO_SPAWN, 0) is returned if the boards are identical.
+    """
+    diff = before ^ after
+    if not diff:
+        return NO_SPAWN, 0
+    position = (diff.bit_length() - 1) // 4
+    exponent = (after >> (4 * position)) & TILE_MASK
+    if (before >> (4 * position)) & TILE_MASK or diff != exponent << (4 * position):
+        raise ValueError('The boards differ by more than one spawned tile')
+    return position, exponent
+
+
+class TrajectoryWriter:
+    """Record the moves and spawns of games and append them to a trajectory store.
+
+    Steps of the current game are buffered and the game is appended to the store by `end_game`, under an
+    exclusive lock of the games file when available, so several processes can record into the same store.
+
+    Parameters
+    ----------
+    path : str
+        The store is written to '{path}.steps' and '{path}.games'.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._steps = bytearray()
+        self._num_steps = 0
+        self._seed = NO_SEED
+        self._initial_board = None
+
+    def start_game(self, game, seed=None):
+        """Start recording a game from its current board, with the seed of the game unless one is given"""
+        if getattr(game, 'size', BOARD_SIZE) != BOARD_SIZE:
+            raise ValueError('Only 4x4 games fit the 64-bit boards of the trajectory store')
+        if seed is None:
+            seed = getattr(game, 'seed', None)
+        self._steps = bytearray()
+        self._num_steps = 0
+        self._seed = NO_SEED if seed is None else seed
+        self._initial_board = packed_board_of(game)
+
+    def record_step(self, before, move, after):
+        """Record one move of the agent and the spawn that followed it
+
+        Parameters
+        ----------
+        before : int
+            The packed board before the move.
+        move : int
+            0 for LEFT, 1 for RIGHT, 2 for UP, 3 for DOWN.
+        after : int
+            The packed board after the move and the spawn.
+        """
+        moved, reward = execute_move(before, move)
+        position, exponent = find_spawn(moved, after)
+        self._steps += STEP.pack(before, move, position, exponent, reward)
+        self._num_steps += 1
+
+    def end_game(self, game):
+        """Append the recorded game to the store"""
+        with open('{}.games'.format(self.path), 'ab') as games:
+            if fcntl is not None:
+                fcntl.flock(games, fcntl.LOCK_EX)
+            try:
+                with open('{}.steps'.format(self.path), 'ab') as steps:
+                    first_step = steps.seek(0, os.SEEK_END) // STEP.size
+                    steps.write(self._steps)
+                games.write(GAME.pack(self._seed, first_step, self._initial_board, packed_board_of(game),
+                                      self._num_steps, game.score))
+                games.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(games, fcntl.LOCK_UN)
+        self._steps = bytearray()
+        self._num_steps = 0
+
+
+def _map(path):
+    """Memory-map a file read-only, or return an empty buffer for an empty file"""
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class TrajectoryStore:
+    """Read a trajectory store written by `TrajectoryWriter` through memory maps.
+
+    Parameters
+    ----------
+    path : str
+        The store is read from '{path}.steps' and '{path}.games'.
+
+    Attributes
+    ----------
+    num_games : int
+        The number of recorded games.
+    num_steps : int
+        The number of recorded steps of all games.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._games = _map('{}.games'.format(path))
+        self._steps = _map('{}.steps'.format(path))
+        self.num_games = len(self._games) // GAME.size
+        # Only count the steps of complete games, another process may be appending one
+        self.num_steps = 0
+        if self.num_games:
+            last = self.game(self.num_games - 1)
+            self.num_steps = last['first_step'] + last['num_steps']
+
+    def close(self):
+        """Unmap the files"""
+        for buffer in (self._games, self._steps):
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.num_games
+
+    def game(self, index):
+        """Return the record of a game as a dict"""
+        seed, first_step, initial_board, final_board, num_steps, score = GAME.unpack_from(
+            self._games, index * GAME.size)
+        return {
+            'seed': None if seed == NO_SEED else seed,
+            'first_step': first_step,
+            'initial_board': initial_board,
+            'final_board': final_board,
+            'num_steps': num_steps,
+            'score': score,
+        }
+
+    def step(self, index):
+        """Return the (board, move, spawn position, spawn exponent, reward) record of a step"""
+        return STEP.unpack_from(self._steps, index * STEP.size)
+
+    def steps(self, game_index):
+        """Iterate over the step records of a game"""
+        record = self.game(game_index)
+        start = record['first_step']
+        for index in range(start, start + record['num_steps']):
+            yield self.step(index)
+
+    def replay(self, game_index):
+        """Replay a game from its initial board and return its packed boards and its score
+
+        Raises ValueError if the replay does not reproduce the recorded boards exactly.
+
+        Return
+        ----------
+        tuple
+            The first element is the list of packed boards before every move, followed by the final board.
+            The second element is the final score.
+        """
+        record = self.game(game_index)
+        board = record['initial_board']
+        boards = []
+        score = 0
+        for step, (recorded, move, position, exponent, reward) in enumerate(self.steps(game_index)):
+            if recorded != board:
+                raise ValueError('Game {} diverges from its record at step {}'.format(game_index, step))
+            boards.append(board)
+            board, gained = execute_move(board, move)
+            score += gained
+            if position != NO_SPAWN:
+                board |= exponent << (4 * position)
+        if board != record['final_board'] or score != record['score']:
+            raise ValueError('Game {} does not end as recorded'.format(game_index))
+        boards.append(board)
+        return boards, score
+
+    def sample(self, count, rng=random):
+        """Return `count` (board, move, reward) tuples drawn uniformly from the steps of all games"""
+        samples = []
+        for _ in range(count):
+            board, move, _, _, reward = self.step(rng.randrange(self.num_steps))
+            samples.append((board, move, reward))
+        return samples
+
+
+if __name__ == '__main__':
+    with TrajectoryStore(sys.argv[1]) as store:
+        for game_index in range(store.num_games):
+            store.replay(game_index)
+        print('{}: {} games, {} steps, every game replays exactly'.format(
+            sys.argv[1], store.num_games, store.num_steps))
@@ -1,12 +1,22 @@
-from tester import MinimaxTester
+"""Play the games of an experiment, see `tester.experiment`.
+
+Usage: python run.py [config.json]
+
+Without a config, the demo experiment plays one game of MinimaxAgent at depth 6. Running the same command
+again resumes an interrupted experiment.
+"""
+
+import sys
+
+from tester.experiment import load_config, run_experiment
+
+DEMO_CONFIG = {
+    'name': 'demo',
+    'runs': [
+        {'agent': 'minimax', 'depths': [6], 'games': 1},
+        # Add other runs here
+    ],
+}
 
 if __name__ == '__main__':
-    # Just for demo
-    testers = [
-        MinimaxTester(max_depth=6, verbose=True)
-        # Add other testers here
-    ]
-
-    for tester in testers:
-        tester.test_one_game()
-#         tester.test_games(iteration=10)
+    run_experiment(load_config(sys.argv[1]) if len(sys.argv) > 1 else DEMO_CONFIG)
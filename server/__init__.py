@@ -0,0 +1 @@
+from .move_server import MoveServer, MoveClient
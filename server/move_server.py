@@ -0,0 +1,437 @@
+"""An asyncio server answering move requests of many concurrent game sessions.
+
+Sessions connect over a Unix socket (an address containing a '/') or TCP ('host:port') and exchange JSON
+lines. A request holds an `id`, the packed `board` (see `game.bitboard`) or the `tiles` as a list of lists,
+and optionally a `deadline` in seconds. The response echoes the `id` with the `move` (None if the game is
+lost) or an `error`: 'overloaded' when admission control rejects the request, 'deadline exceeded' when the
+move could not be found in time. A request {"id": ..., "op": "stats"} returns the server stats instead.
+
+Searches run in a pool of worker processes, each keeping a warm agent (lookup tables included). Requests for
+a board already being searched wait for that search instead of starting another one, as long as the search
+may run at least as long as they would let it (no deadline, or a later one), and moves found without a
+deadline are cached.
+
+Usage: python -m server.move_server [--address /tmp/endless-2048.sock] [--agent minimax] [--max-depth 6]
+                                    [--workers 1] [--max-pending 64] [--report-interval 10]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent import ExpectimaxAgent, MinimaxAgent, NTupleAgent
+from game import GameState
+from game.bitboard import BOARD_SIZE, get_tables, pack_board, packed_board_of
+
+AGENTS = {'minimax': MinimaxAgent, 'expectimax': ExpectimaxAgent, 'ntuple': NTupleAgent}
+DEFAULT_ADDRESS = '/tmp/endless-2048.sock'
+# The window in seconds of the throughput reported by the stats
+STATS_WINDOW = 10.
+# How long a response may take past its deadline, for the worker to return the move it found in time
+DEADLINE_GRACE = 0.05
+
+_worker_agent = None
+
+
+class ServerOverloaded(Exception):
+    """Raised when a request would exceed the max number of pending searches"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request could not be answered before its deadline"""
+
+
+def _init_worker(agent_name, agent_config):
+    """Create the agent of a worker process and load its lookup tables"""
+    global _worker_agent
+    _worker_agent = AGENTS[agent_name](**agent_config)
+    get_tables()
+    evaluator = getattr(_worker_agent, 'evaluator', None)
+    if evaluator is not None:
+        evaluator.tables()
+
+
+def _search(packed, deadline):
+    """Return the move of a packed board found by the agent of the worker, or None if the deadline passed
+
+    Return
+    ----------
+    tuple
+        The first element is the move.
+        The second element is whether the deadline passed before the search could start.
+    """
+    agent = _worker_agent
+    if hasattr(agent, 'time_limit'):
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None, True
+            agent.time_limit = remaining
+        else:
+            agent.time_limit = None
+    return agent.get_move(GameState(packed)), False
+
+
+def parse_board(message):
+    """Return the packed board of a request, from its `board` or its `tiles`
+
+    Raises ValueError if the board is not a valid 4x4 board.
+    """
+    if 'board' in message:
+        packed = message['board']
+        # Not isinstance, which would accept true and false
+        if type(packed) is not int or not 0 <= packed < 1 << 64:
+            raise ValueError('board must be an integer in [0, 2**64)')
+        return packed
+    tiles = message['tiles']
+    if (not isinstance(tiles, list) or len(tiles) != BOARD_SIZE
+            or any(not isinstance(row, list) or len(row) != BOARD_SIZE for row in tiles)):
+        raise ValueError('tiles must be {0} rows of {0} tiles'.format(BOARD_SIZE))
+    for tile in (tile for row in tiles for tile in row):
+        if type(tile) is not int or tile == 1 or tile < 0 or tile & (tile - 1):
+            raise ValueError('tiles must be 0 or powers of 2 from 2 on, got {!r}'.format(tile))
+    return pack_board(tiles)
+
+
+def parse_address(address):
+    """Return ('unix', path) or ('tcp', (host, port)) for an address"""
+    if '/' in address:
+        return 'unix', address
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or 'localhost', int(port))
+
+
+class MoveServer:
+    """Serve the moves of an agent to concurrent sessions.
+
+    Parameters
+    ----------
+    agent : str, optional (default='minimax')
+        The agent searching the moves, among `AGENTS`.
+    agent_config : dict, optional (default=None)
+        The arguments of the agent constructor.
+    workers : int, optional (default=1)
+        The number of worker processes searching the moves.
+    max_pending : int, optional (default=64)
+        See attributes.
+    cache_size : int, optional (default=100000)
+        The max number of cached moves.
+    report_interval : float, optional (default=None)
+        If set, the stats are printed out every `report_interval` seconds.
+
+    Attributes
+    ----------
+    max_pending : int
+        The max number of searches queued or running at once, requests needing one more are rejected.
+    received : int
+        The number of move requests received.
+    completed : int
+        The number of move requests answered with a move.
+    coalesced : int
+        The number of requests answered by a search started for another request.
+    cache_hits : int
+        The number of requests answered by the cache.
+    rejected : int
+        The number of requests rejected by the admission control.
+    expired : int
+        The number of requests which missed their deadline.
+    """
+
+    def __init__(self, agent='minimax', agent_config=None, workers=1, max_pending=64, cache_size=100000,
+                 report_interval=None):
+        if agent not in AGENTS:
+            raise ValueError('Unknown agent {}, expected one of {}'.format(agent, ', '.join(AGENTS)))
+        self.agent = agent
+        self.agent_config = agent_config or {}
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.report_interval = report_interval
+        self.received = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.expired = 0
+        self._cache = collections.OrderedDict()
+        # The searches running for each packed board, as (deadline, future) pairs
+        self._pending = {}
+        self._num_pending = 0
+        self._done_times = collections.deque()
+        self._started = None
+        self._pool = None
+        self._server = None
+        self._address = None
+
+    def _get_pool(self):
+        """Return the pool of worker processes, creating it on first use"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.agent, self.agent_config))
+        return self._pool
+
+    async def get_move(self, packed, deadline=None):
+        """Return the move of a packed board
+
+        Parameters
+        ----------
+        packed : int
+            The packed board.
+        deadline : float, optional (default=None)
+            The time (as returned by `time.time`) before which the move is needed.
+
+        Raises ServerOverloaded if too many searches are pending, DeadlineExceeded if the deadline passes.
+        """
+        self.received += 1
+        if packed in self._cache:
+            self._cache.move_to_end(packed)
+            self.cache_hits += 1
+            return self._answer(self._cache[packed])
+
+        # Only join a search that may run at least as long as this request allows, so that no request gets a
+        # move cut short (or expired) by the deadline of another one
+        future = next((future for search_deadline, future in self._pending.get(packed, ())
+                       if search_deadline is None or (deadline is not None and search_deadline >= deadline)),
+                      None)
+        if future is None:
+            if self._num_pending >= self.max_pending:
+                self.rejected += 1
+                raise ServerOverloaded()
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_pool(), _search, packed, deadline)
+            search = (deadline, future)
+            self._pending.setdefault(packed, []).append(search)
+            self._num_pending += 1
+            future.add_done_callback(lambda f: self._search_done(packed, search))
+        else:
+            self.coalesced += 1
+
+        timeout = None if deadline is None else max(0., deadline - time.time()) + DEADLINE_GRACE
+        try:
+            # Shielded, so that a waiter giving up does not cancel the search other waiters wait for
+            move, expired = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            expired = True
+        if expired:
+            self.expired += 1
+            raise DeadlineExceeded()
+        return self._answer(move)
+
+    def _search_done(self, packed, search):
+        """Forget a finished search and cache its move if it was searched without deadline"""
+        deadline, future = search
+        searches = self._pending[packed]
+        searches.remove(search)
+        if not searches:
+            del self._pending[packed]
+        self._num_pending -= 1
+        if deadline is None and not future.cancelled() and future.exception() is None:
+            self._cache[packed] = future.result()[0]
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _answer(self, move):
+        """Count an answered request"""
+        self.completed += 1
+        self._done_times.append(time.time())
+        return move
+
+    def stats(self):
+        """Return the queue depth, the throughput over the last `STATS_WINDOW` seconds and the counters"""
+        now = time.time()
+        while self._done_times and self._done_times[0] < now - STATS_WINDOW:
+            self._done_times.popleft()
+        window = min(STATS_WINDOW, now - self._started) if self._started is not None else STATS_WINDOW
+        return {
+            'queue_depth': self._num_pending,
+            'moves_per_sec': len(self._done_times) / window if window > 0 else 0.,
+            'received': self.received,
+            'completed': self.completed,
+            'coalesced': self.coalesced,
+            'cache_hits': self.cache_hits,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'cached_moves': len(self._cache),
+        }
+
+    async def handle_request(self, message):
+        """Return the response to a decoded request"""
+        response = {'id': message.get('id')}
+        if message.get('op') == 'stats':
+            response['stats'] = self.stats()
+            return response
+        try:
+            packed = parse_board(message)
+            deadline = time.time() + float(message['deadline']) if message.get('deadline') is not None else None
+        except (KeyError, TypeError, ValueError) as e:
+            response['error'] = 'bad request: {}'.format(e)
+            return response
+        try:
+            response['move'] = await self.get_move(packed, deadline)
+        except ServerOverloaded:
+            response['error'] = 'overloaded'
+        except DeadlineExceeded:
+            response['error'] = 'deadline exceeded'
+        except Exception as e:
+            # A failed search must still be answered, or the session would wait for the response forever
+            response['error'] = 'search failed: {!r}'.format(e)
+        return response
+
+    async def handle_client(self, reader, writer):
+        """Answer the requests of one session, concurrently and in order of completion"""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            try:
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise ValueError('expected a JSON object')
+                response = await self.handle_request(message)
+            except ValueError as e:
+                response = {'id': None, 'error': 'bad request: {}'.format(e)}
+            async with write_lock:
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, address=DEFAULT_ADDRESS):
+        """Start listening on an address and warm the workers up"""
+        kind, target = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)
+            self._server = await asyncio.start_unix_server(self.handle_client, path=target)
+        else:
+            self._server = await asyncio.start_server(self.handle_client, host=target[0], port=target[1])
+        self._address = address
+        self._started = time.time()
+        # Create every worker now rather than on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._get_pool(), time.sleep, 0)
+                               for _ in range(self.workers)])
+        return self._server
+
+    async def _report(self):
+        """Print the stats every `report_interval` seconds"""
+        while True:
+            await asyncio.sleep(self.report_interval)
+            stats = self.stats()
+            print('queue depth {queue_depth}, {moves_per_sec:.1f} moves/s, {received} received, '
+                  '{coalesced} coalesced, {cache_hits} cache hits, {rejected} rejected, '
+                  '{expired} expired'.format(**stats))
+
+    async def serve_forever(self, address=DEFAULT_ADDRESS):
+        """Serve requests until cancelled"""
+        server = await self.start(address)
+        reporter = asyncio.ensure_future(self._report()) if self.report_interval else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            self.close()
+
+    def close(self):
+        """Stop listening and shut the worker processes down"""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            kind, target = parse_address(self._address)
+            if kind == 'unix' and os.path.exists(target):
+                os.unlink(target)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+class MoveClient:
+    """A blocking client of a `MoveServer`, which can be used as an agent by testers.
+
+    Parameters
+    ----------
+    address : str, optional (default=DEFAULT_ADDRESS)
+        The address of the server, see `parse_address`.
+    deadline : float, optional (default=None)
+        The deadline of every move request in seconds.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, deadline=None):
+        self.deadline = deadline
+        kind, target = parse_address(address)
+        if kind == 'unix':
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.connect(target)
+        self._file = self._socket.makefile('rwb')
+        self._next_id = 0
+
+    def request(self, message):
+        """Send one request and return its response"""
+        self._next_id += 1
+        message = dict(message, id=self._next_id)
+        self._file.write((json.dumps(message) + '\n').encode())
+        self._file.flush()
+        return json.loads(self._file.readline())
+
+    def get_move(self, game):
+        """Return the move of a game, raises RuntimeError if the server answered with an error"""
+        response = self.request({'board': packed_board_of(game), 'deadline': self.deadline})
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['move']
+
+    def stats(self):
+        """Return the stats of the server"""
+        return self.request({'op': 'stats'})['stats']
+
+    def close(self):
+        """Close the connection"""
+        self._file.close()
+        self._socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve agent moves over a socket')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='Unix socket path or host:port')
+    parser.add_argument('--agent', default='minimax', choices=sorted(AGENTS), help='agent searching the moves')
+    parser.add_argument('--max-depth', type=int, default=6, help='max depth of minimax and expectimax agents')
+    parser.add_argument('--weights', help='weights of the ntuple agent')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--max-pending', type=int, default=64, help='max number of pending searches')
+    parser.add_argument('--report-interval', type=float, default=10., help='seconds between stats reports')
+    args = parser.parse_args()
+
+    agent_config = {'weights': args.weights} if args.agent == 'ntuple' else {'max_depth': args.max_depth}
+    server = MoveServer(args.agent, agent_config, workers=args.workers, max_pending=args.max_pending,
+                        report_interval=args.report_interval)
+    print('Serving {} moves on {}'.format(args.agent, args.address))
+    try:
+        asyncio.run(server.serve_forever(args.address))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
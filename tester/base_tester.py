@@ -1,4 +1,52 @@
+import multiprocessing
+import os
+import random
+import signal
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+
 from game import Game2048
+from game.results import get_sink
+
+
+def _ignore_interrupts(worker_pids):
+    """Let the parent process alone handle Ctrl-C, so that it can save the finished games
+
+    The worker also reports its PID to the `multiprocessing.SimpleQueue` `worker_pids`, see `_drain_pool`.
+    """
+    worker_pids.put(os.getpid())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _drain_pool(executor, futures, worker_pids):
+    """After Ctrl-C, cancel the games of a pool not started yet and wait for the running ones to finish
+
+    A second Ctrl-C terminates the workers instead, dropping the games they were playing. The executor has no
+    public way to stop the tasks already running, so the workers are killed by the PIDs they put in `worker_pids`
+    when they started, see `_ignore_interrupts`.
+    """
+    executor.shutdown(wait=False, cancel_futures=True)
+    for future in futures:
+        future.cancel()
+    running = [future for future in futures if not future.done()]
+    if not running:
+        return
+    print('Waiting for the {} running games, press Ctrl-C again to drop them'.format(len(running)))
+    try:
+        wait(running)
+    except KeyboardInterrupt:
+        while not worker_pids.empty():
+            try:
+                os.kill(worker_pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def _play_one_game(tester, seed):
+    """Play one seeded game in a worker process and return its info and report instead of saving them"""
+    random.seed(seed)
+    tester.game_seed = seed
+    info = tester.test_one_game(save=False)
+    return info, tester.game_report()
 
 
 class BaseTester:
@@ -11,15 +59,26 @@ class BaseTester:
         If False, nothing will be printed out.
     result_path : string
         Game result saving path.
+    game_class : type
+        The game backend used to create games, `Game2048` or `Bitboard2048`.
+    game_seed : int or None
+        The seed of the game being played by `test_multiple_games`, which also seeds its spawns.
+        If None, every new game draws its own seed.
+    board_size : int
+        The number of rows and columns of the boards of the games, 4 by default.
     """
+    game_class = Game2048
 
     def __init__(self):
         self.verbose = True
         self.result_path = ''
+        self.game_seed = None
+        self.board_size = 4
 
     def create_one_game(self):
         """Generate a new game instance"""
-        return Game2048(task_name=self.result_path, game_mode=False)
+        return self.game_class(task_name=self.result_path, game_mode=False, seed=self.game_seed,
+                               size=self.board_size)
 
     def show_game_status(self, game, diff, step):
         """In Verbose mode, print out the current game information"""
@@ -28,11 +87,98 @@ class BaseTester:
             print('Time cost ===> {:.3f}s'.format(diff))
             game.print_game()
 
-    def test_multiple_games(self, iteration=10):
-        """Run the game multiple times"""
-        # TODO: multithread?
-        for i in range(iteration):
-            self.test_one_game()
+    def show_progress(self, done, iteration, seed, info):
+        """Print a one-line summary of a finished game"""
+        score, best_tile, step, time_cost = info[:4]
+        print('Game {}/{} (seed {}): score {}, best tile {}, {} steps, {:.1f}s'.format(
+            done, iteration, seed, score, best_tile, step, time_cost))
+
+    def save_results(self, results):
+        """Append the info of finished games to the result CSV at once"""
+        if not results:
+            return
+        sink = get_sink(self.result_path)
+        sink.write_many(results)
+        sink.flush()
+
+    def game_report(self):
+        """Return the extra data of the last game played besides its info (e.g. latencies), or None"""
+        return None
+
+    def save_reports(self, reports):
+        """Save the extra data of finished games at once"""
+        pass
+
+    def finish_run(self):
+        """Save whatever summarizes all the games of a `test_multiple_games` run"""
+        pass
+
+    def test_multiple_games(self, iteration=10, workers=1, seed=None):
+        """Run the game multiple times
+
+        Parameters
+        ----------
+        iteration : int
+            The number of games to play.
+        workers : int, optional (default=1)
+            If greater than 1, games are spread across a pool of this many processes. Results are then collected
+            and saved by this process. On Ctrl-C, the games not started yet are cancelled and the running ones
+            are waited for and saved, a second Ctrl-C drops them.
+        seed : int, optional (default=None)
+            If given, the i-th game is seeded with `seed + i`, otherwise every game gets a random seed.
+
+        Return
+        ----------
+        list
+            The info of every finished game, see `Game2048.game_info`.
+        """
+        if seed is None:
+            seeds = [random.randrange(2 ** 32) for _ in range(iteration)]
+        else:
+            seeds = [seed + i for i in range(iteration)]
+
+        results = []
+        if workers <= 1:
+            for game_seed in seeds:
+                random.seed(game_seed)
+                self.game_seed = game_seed
+                info = self.test_one_game()
+                results.append(info)
+                self.show_progress(len(results), iteration, game_seed, info)
+            self.finish_run()
+            return results
+
+        reports = []
+        collected = set()
+
+        def collect(future):
+            info, report = future.result()
+            collected.add(future)
+            results.append(info)
+            reports.append(report)
+            self.show_progress(len(results), iteration, futures[future], info)
+
+        worker_pids = multiprocessing.SimpleQueue()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_ignore_interrupts, initargs=(worker_pids,))
+        futures = {}
+        try:
+            for game_seed in seeds:
+                futures[executor.submit(_play_one_game, self, game_seed)] = game_seed
+            for future in as_completed(futures):
+                collect(future)
+        except KeyboardInterrupt:
+            _drain_pool(executor, futures, worker_pids)
+            for future in futures:
+                if future not in collected and not future.cancelled() and future.exception() is None:
+                    collect(future)
+            print('Interrupted, keeping the {} finished games'.format(len(results)))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.save_results(results)
+            self.save_reports(reports)
+            self.finish_run()
+
+        return results
 
-    def test_one_game(self):
+    def test_one_game(self, save=True):
         return NotImplementedError
@@ -0,0 +1,426 @@
+"""A resumable experiment runner playing the games of several agent configurations.
+
+An experiment is described by a JSON config, e.g.
+
+    {
+        "name": "depth-sweep",
+        "seed": 0,
+        "runs": [
+            {"agent": "minimax", "depths": [4, 6], "games": 50},
+            {"agent": "expectimax", "depths": [3], "games": 50, "agent_config": {"prob_cutoff": 0.001}},
+            {"agent": "random", "games": 200, "board_size": 5}
+        ]
+    }
+
+Every run is expanded to one configuration per depth, named after the agent and the depth (e.g. 'minimax-d4')
+unless the run has a `name`. Game `k` of every configuration is seeded with `seed + k`, so configurations are
+compared on the same spawn sequences. Games are scheduled round-robin: the k-th game of every configuration is
+played before the (k + 1)-th game of any, so that results stay balanced whenever the experiment is cut short.
+
+Finished games are appended to '{output_dir}/{configuration}.csv' right away. Games in progress are
+checkpointed every `checkpoint_interval` seconds to '{output_dir}/checkpoints': the game with its spawn
+generator, the global random state and the state of the agent (see `BaseAgent.get_state`). On Ctrl-C, every
+running game finishes its current move and is checkpointed (a second Ctrl-C stops right away, keeping the last
+checkpoints). Running the same config again resumes the experiment: games found in the result CSVs are skipped
+and checkpointed games continue from their last checkpoint.
+
+Usage: python -m tester.experiment <config.json> [--workers N] [--checkpoint-interval SECONDS]
+"""
+
+import argparse
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from agent import ExpectimaxAgent, MinimaxAgent, MonteCarloAgent, NTupleAgent, RandomAgent
+from game import Bitboard2048, Game2048
+from game.files import atomic_open
+from game.results import get_sink, load_csv
+from tester.base_tester import _drain_pool, _ignore_interrupts
+
+AGENTS = {'random': RandomAgent, 'minimax': MinimaxAgent, 'expectimax': ExpectimaxAgent,
+          'monte_carlo': MonteCarloAgent, 'ntuple': NTupleAgent}
+# The constructor argument set by the `depths` of a run
+DEPTH_ARGUMENTS = {'minimax': 'max_depth', 'expectimax': 'max_depth', 'ntuple': 'search_depth'}
+BACKENDS = {'list': Game2048, 'bitboard': Bitboard2048}
+EXPERIMENT_KEYS = ('name', 'runs', 'seed', 'output_dir', 'checkpoint_interval', 'workers')
+RUN_KEYS = ('agent', 'games', 'depths', 'name', 'agent_config', 'board_size', 'backend')
+DEFAULT_CHECKPOINT_INTERVAL = 60.
+
+# Set on Ctrl-C, for the games to checkpoint and stop at the end of their current move
+_stop_event = None
+
+
+class GameInterrupted(Exception):
+    """Raised by `play_game` when the experiment is stopped, once the game is checkpointed"""
+
+
+def _init_worker(stop_event, worker_pids):
+    """Leave Ctrl-C to the parent process, which tells the games to stop through `stop_event`"""
+    global _stop_event
+    _ignore_interrupts(worker_pids)
+    _stop_event = stop_event
+
+
+class Configuration:
+    """One agent configuration of an experiment.
+
+    Parameters
+    ----------
+    name : str
+        See attributes.
+    agent : str
+        See attributes.
+    games : int
+        See attributes.
+    agent_config : dict, optional (default=None)
+        See attributes.
+    board_size : int, optional (default=4)
+        See attributes.
+    backend : str, optional (default='bitboard')
+        See attributes.
+
+    Attributes
+    ----------
+    name : str
+        The name of the configuration, also the name of its result CSV.
+    agent : str
+        The agent playing the games, among `AGENTS`.
+    games : int
+        The number of games to play.
+    agent_config : dict
+        The arguments of the agent constructor.
+    board_size : int
+        The number of rows and columns of the boards.
+    backend : str
+        The game backend, among `BACKENDS`.
+    """
+
+    def __init__(self, name, agent, games, agent_config=None, board_size=4, backend='bitboard'):
+        if agent not in AGENTS:
+            raise ValueError('Unknown agent {}, expected one of {}'.format(agent, ', '.join(sorted(AGENTS))))
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend {}, expected one of {}'.format(backend, ', '.join(sorted(BACKENDS))))
+        self.name = name
+        self.agent = agent
+        self.games = games
+        self.agent_config = dict(agent_config or {})
+        self.board_size = board_size
+        self.backend = backend
+
+    def __repr__(self):
+        return 'Configuration({!r}, {!r}, {}, {!r})'.format(self.name, self.agent, self.games, self.agent_config)
+
+    def make_agent(self, seed):
+        """Create the agent of a game, seeding its random generator (if it has one) with the game seed"""
+        cls = AGENTS[self.agent]
+        kwargs = dict(self.agent_config)
+        if 'seed' in inspect.signature(cls).parameters:
+            kwargs.setdefault('seed', seed)
+        return cls(**kwargs)
+
+    def make_game(self, task_name, seed):
+        """Create a new game"""
+        return BACKENDS[self.backend](task_name=task_name, game_mode=False, seed=seed, size=self.board_size)
+
+
+def load_config(path):
+    """Load an experiment config from a JSON file"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def expand_runs(config):
+    """Return the configurations of an experiment config, one per run and depth"""
+    unknown = set(config) - set(EXPERIMENT_KEYS)
+    if unknown:
+        raise ValueError('Unknown experiment keys: {}'.format(', '.join(sorted(unknown))))
+    configurations = []
+    for run in config['runs']:
+        unknown = set(run) - set(RUN_KEYS)
+        if unknown:
+            raise ValueError('Unknown run keys: {}'.format(', '.join(sorted(unknown))))
+        agent = run['agent']
+        depths = run.get('depths')
+        if depths is None:
+            variants = [(run.get('name', agent), run.get('agent_config'))]
+        elif agent not in DEPTH_ARGUMENTS:
+            raise ValueError('The {} agent has no depth'.format(agent))
+        else:
+            variants = [('{}-d{}'.format(run.get('name', agent), depth),
+                         dict(run.get('agent_config') or {}, **{DEPTH_ARGUMENTS[agent]: depth}))
+                        for depth in depths]
+        for name, agent_config in variants:
+            configurations.append(Configuration(name, agent, run['games'], agent_config,
+                                                run.get('board_size', 4), run.get('backend', 'bitboard')))
+    names = [configuration.name for configuration in configurations]
+    if len(set(names)) != len(names):
+        raise ValueError('Configuration names must be unique, got {}'.format(', '.join(names)))
+    return configurations
+
+
+def schedule(configurations, completed):
+    """Return the (configuration, game index) pairs left to play, round-robin over the configurations
+
+    Parameters
+    ----------
+    configurations : list
+        The configurations of the experiment.
+    completed : dict
+        The set of finished game indexes of every configuration, by name.
+    """
+    max_games = max([configuration.games for configuration in configurations], default=0)
+    return [(configuration, index) for index in range(max_games) for configuration in configurations
+            if index < configuration.games and index not in completed.get(configuration.name, ())]
+
+
+def completed_games(result_path, seed):
+    """Return the indexes of the games found in a result CSV, given the seed of the first game"""
+    if not os.path.exists(result_path):
+        return set()
+    return {game_seed - seed for game_seed in load_csv(result_path)['seed'] if game_seed >= seed}
+
+
+def save_snapshot(path, snapshot):
+    """Pickle the checkpoint of a game in progress, atomically so that a crash never leaves a partial file"""
+    with atomic_open(path) as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(path):
+    """Load the checkpoint of a game in progress, or return None if there is none"""
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def play_game(configuration, task_name, seed, snapshot_path, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+    """Play one game of a configuration, from its checkpoint if there is one, and return its info
+
+    The game is checkpointed to `snapshot_path` every `checkpoint_interval` seconds, and between two moves once
+    the experiment is stopped, raising GameInterrupted. The step of the game info is the number of moves of the
+    agent.
+    """
+    if _stop_event is not None and _stop_event.is_set():
+        raise GameInterrupted()
+    agent = configuration.make_agent(seed)
+    snapshot = load_snapshot(snapshot_path)
+    if snapshot is None:
+        random.seed(seed)
+        game = configuration.make_game(task_name, seed)
+        step = 0
+        elapsed = 0.
+    else:
+        game, step, elapsed = snapshot['game'], snapshot['step'], snapshot['elapsed']
+        random.setstate(snapshot['random_state'])
+        agent.set_state(snapshot['agent_state'])
+
+    def checkpoint():
+        save_snapshot(snapshot_path, {'game': game, 'step': step, 'elapsed': elapsed + time.time() - start,
+                                      'random_state': random.getstate(), 'agent_state': agent.get_state()})
+
+    start = last_checkpoint = time.time()
+    try:
+        while not game.is_lost():
+            # Only checkpoint between two moves, never a half-played turn
+            if _stop_event is not None and _stop_event.is_set():
+                checkpoint()
+                raise GameInterrupted()
+            move = agent.get_move(game)
+            game.perform_move(move)
+            game.perform_move(move)
+            step += 1
+            if time.time() - last_checkpoint >= checkpoint_interval:
+                checkpoint()
+                last_checkpoint = time.time()
+    finally:
+        if hasattr(agent, 'close'):
+            agent.close()
+    return game.game_info(step=step, time_cost=elapsed + time.time() - start)
+
+
+class ExperimentRunner:
+    """Play, checkpoint and resume the games of an experiment config.
+
+    Parameters
+    ----------
+    config : dict
+        The experiment config, see the module documentation.
+    workers : int, optional (default=None)
+        If given, overrides the `workers` of the config.
+    verbose : bool, optional (default=True)
+        If True, a line is printed out for every finished game.
+
+    Attributes
+    ----------
+    name : str
+        The name of the experiment.
+    configurations : list
+        The agent configurations, see `expand_runs`.
+    seed : int
+        The seed of the first game of every configuration.
+    output_dir : str
+        The directory of the result CSVs and of the checkpoints.
+    checkpoint_interval : float
+        The number of seconds between two checkpoints of a game in progress.
+    workers : int
+        If greater than 1, games are spread across a pool of this many processes.
+    """
+
+    def __init__(self, config, workers=None, verbose=True):
+        self.name = config['name']
+        self.configurations = expand_runs(config)
+        self.seed = config.get('seed', 0)
+        self.output_dir = config.get('output_dir', os.path.join('results', self.name))
+        self.checkpoint_interval = config.get('checkpoint_interval', DEFAULT_CHECKPOINT_INTERVAL)
+        self.workers = workers if workers is not None else config.get('workers', 1)
+        self.verbose = verbose
+
+    def task_name(self, configuration):
+        """Return the task name of a configuration, its results are appended to '{task_name}.csv'"""
+        return os.path.join(self.output_dir, configuration.name)
+
+    def snapshot_path(self, configuration, index):
+        """Return the path of the checkpoint of a game in progress"""
+        return os.path.join(self.output_dir, 'checkpoints', '{}-{}.pkl'.format(configuration.name, index))
+
+    def completed(self):
+        """Return the set of finished game indexes of every configuration, read from the result CSVs"""
+        return {configuration.name: completed_games('{}.csv'.format(self.task_name(configuration)), self.seed)
+                for configuration in self.configurations}
+
+    def pending(self):
+        """Return the (configuration, game index) pairs left to play, checkpointed games first"""
+        pending = schedule(self.configurations, self.completed())
+        started = [item for item in pending if os.path.exists(self.snapshot_path(*item))]
+        return started + [item for item in pending if item not in started]
+
+    def _game_args(self, configuration, index):
+        """Return the arguments of `play_game` for a game"""
+        return (configuration, self.task_name(configuration), self.seed + index,
+                self.snapshot_path(configuration, index), self.checkpoint_interval)
+
+    def _finish_game(self, configuration, index, info, done, total):
+        """Save the info of a finished game, then drop its checkpoint"""
+        sink = get_sink(self.task_name(configuration))
+        sink.write(info)
+        sink.flush()
+        path = self.snapshot_path(configuration, index)
+        if os.path.exists(path):
+            os.remove(path)
+        if self.verbose:
+            score, best_tile, step, time_cost = info[:4]
+            print('[{}/{}] {} game {} (seed {}): score {}, best tile {}, {} steps, {:.1f}s'.format(
+                done, total, configuration.name, index, self.seed + index, score, best_tile, step, time_cost))
+
+    def run(self):
+        """Play every game left, return the number of games finished by this call"""
+        os.makedirs(os.path.join(self.output_dir, 'checkpoints'), exist_ok=True)
+        # Drop the checkpoints of games saved right before a crash, which were not removed yet
+        completed = self.completed()
+        for configuration in self.configurations:
+            for index in completed[configuration.name]:
+                path = self.snapshot_path(configuration, index)
+                if os.path.exists(path):
+                    os.remove(path)
+
+        pending = self.pending()
+        if self.verbose:
+            print('Experiment {}: {} games left, {} of them checkpointed'.format(
+                self.name, len(pending), sum(os.path.exists(self.snapshot_path(*item)) for item in pending)))
+        if self.workers <= 1:
+            return self._run_serial(pending)
+        return self._run_parallel(pending)
+
+    def _run_serial(self, pending):
+        """Play the games in this process, the first Ctrl-C stopping them at the end of the current move"""
+        global _stop_event
+        _stop_event = threading.Event()
+
+        def stop(signum, frame):
+            _stop_event.set()
+            # A second Ctrl-C interrupts right away
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        in_main_thread = threading.current_thread() is threading.main_thread()
+        if in_main_thread:
+            previous_handler = signal.signal(signal.SIGINT, stop)
+        done = 0
+        try:
+            for configuration, index in pending:
+                info = play_game(*self._game_args(configuration, index))
+                done += 1
+                self._finish_game(configuration, index, info, done, len(pending))
+        except (GameInterrupted, KeyboardInterrupt):
+            print('Interrupted after {} games, run the experiment again to resume it'.format(done))
+        finally:
+            _stop_event = None
+            if in_main_thread:
+                signal.signal(signal.SIGINT, previous_handler)
+        return done
+
+    def _run_parallel(self, pending):
+        """Play the games in a pool of processes, Ctrl-C stopping them at the end of their current move"""
+        stop_event = multiprocessing.Event()
+        worker_pids = multiprocessing.SimpleQueue()
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(stop_event, worker_pids))
+        futures = {}
+        collected = set()
+        done = 0
+
+        def collect(future):
+            nonlocal done
+            collected.add(future)
+            configuration, index = futures[future]
+            info = future.result()
+            done += 1
+            self._finish_game(configuration, index, info, done, len(pending))
+
+        try:
+            for configuration, index in pending:
+                futures[executor.submit(play_game, *self._game_args(configuration, index))] = (configuration, index)
+            for future in as_completed(futures):
+                collect(future)
+        except KeyboardInterrupt:
+            stop_event.set()
+            _drain_pool(executor, futures, worker_pids)
+            # Save the games which ended before noticing the stop, the others raised GameInterrupted
+            for future in futures:
+                if future not in collected and not future.cancelled() and future.exception() is None:
+                    collect(future)
+            print('Interrupted after {} games, run the experiment again to resume it'.format(done))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return done
+
+
+def run_experiment(config, workers=None, verbose=True):
+    """Play the games left of an experiment config, see `ExperimentRunner`"""
+    return ExperimentRunner(config, workers, verbose).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play, checkpoint and resume the games of an experiment')
+    parser.add_argument('config', help='path of the JSON experiment config')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, overrides the config')
+    parser.add_argument('--checkpoint-interval', type=float, default=None,
+                        help='seconds between two checkpoints of a game, overrides the config')
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.checkpoint_interval is not None:
+        config['checkpoint_interval'] = args.checkpoint_interval
+    run_experiment(config, args.workers)
+
+
+if __name__ == '__main__':
+    main()
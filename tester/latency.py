@@ -0,0 +1,91 @@
+import math
+
+PERCENTILES = (50, 90, 99)
+# Lower bounds of the empty tile ranges used to bucket latencies by game phase
+EMPTY_TILE_BUCKETS = (0, 2, 4, 8)
+
+
+def empty_tile_bucket(empty_tiles):
+    """Return the label of the empty tile range, e.g. '2-3' or '8+'"""
+    for low, high in zip(EMPTY_TILE_BUCKETS, EMPTY_TILE_BUCKETS[1:]):
+        if empty_tiles < high:
+            return '{}-{}'.format(low, high - 1)
+    return '{}+'.format(EMPTY_TILE_BUCKETS[-1])
+
+
+class LatencyHistogram:
+    """A histogram of latencies with geometrically growing buckets.
+
+    Recording a latency only increments the count of its bucket, so the histogram is cheap and small
+    whatever the number of moves, and histograms of several games can be merged. Percentiles are
+    accurate up to the bucket width, about 9% with the default `growth`.
+
+    Parameters
+    ----------
+    min_value : float, optional (default=1e-6)
+        The upper bound of the first bucket, in seconds.
+    growth : float, optional (default=2 ** 0.125)
+        The ratio between the bounds of two consecutive buckets.
+
+    Attributes
+    ----------
+    count : int
+        The number of recorded latencies.
+    total : float
+        The sum of recorded latencies.
+    max : float
+        The largest recorded latency.
+    """
+
+    def __init__(self, min_value=1e-6, growth=2 ** 0.125):
+        self.min_value = min_value
+        self.growth = growth
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self._buckets = {}
+        self._log_growth = math.log(growth)
+
+    def _bucket(self, value):
+        """Return the index of the bucket holding the value"""
+        if value <= self.min_value:
+            return 0
+        return int(math.ceil(math.log(value / self.min_value) / self._log_growth))
+
+    def record(self, value):
+        """Record one latency in seconds"""
+        index = self._bucket(value)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the latencies of another histogram with the same buckets"""
+        assert (self.min_value, self.growth) == (other.min_value, other.growth)
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Return the latency below which `p` percent of the recorded latencies fall"""
+        if not self.count:
+            return 0.
+        rank = p / 100. * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(self.min_value * self.growth ** index, self.max)
+        return self.max
+
+    def summary(self):
+        """Return count, mean, p50, p90, p99 and max"""
+        summary = {'count': self.count, 'mean': self.total / self.count if self.count else 0.}
+        for p in PERCENTILES:
+            summary['p{}'.format(p)] = self.percentile(p)
+        summary['max'] = self.max
+        return summary
@@ -1,6 +1,14 @@
 from agent import MinimaxAgent
+from agent.stats import SearchStats
+from game.bitboard import packed_board_of
+from game.trajectory import TrajectoryWriter
 from tester import BaseTester
+from tester.latency import LatencyHistogram, PERCENTILES, empty_tile_bucket
+import csv
+import json
+import os
 import time
+import uuid
 
 
 class MinimaxTester(BaseTester):
@@ -12,6 +20,14 @@ class MinimaxTester(BaseTester):
         See attributes.
     max_depth : int
         See attributes.
+    log_stats : bool, optional (default=False)
+        See attributes.
+    depth_policy : AdaptiveDepthPolicy, optional (default=None)
+        See attributes.
+    record_trajectories : bool, optional (default=False)
+        See attributes.
+    board_size : int, optional (default=4)
+        See attributes.
 
     Attributes
     ----------
@@ -22,35 +38,169 @@ class MinimaxTester(BaseTester):
         Game result saving path.
     max_depth : int
         This int will be used as the maximum depth of the minimax search tree.
+    log_stats : bool
+        If True, the search stats of every move (see `SearchStats`) are appended as JSON lines to
+        '{result_path}_stats.jsonl', next to the result CSV.
+    depth_policy : AdaptiveDepthPolicy or None
+        If set, it picks the depth of every move instead of `max_depth`, see `MinimaxAgent`.
+    record_trajectories : bool
+        If True, the moves and spawns of every game are appended to the trajectory store
+        '{result_path}_trajectories', see `game.trajectory`. Only 4x4 games can be recorded.
+    board_size : int
+        The number of rows and columns of the boards of the games.
+    latency : LatencyHistogram
+        The `get_move` latencies of all the games saved by this tester.
+    phase_latency : dict
+        The `get_move` latencies of all the games saved by this tester, by game phase: the keys are
+        (max tile, empty tile range) pairs, see `empty_tile_bucket`.
     """
 
-    def __init__(self, verbose=True, max_depth=8):
+    def __init__(self, verbose=True, max_depth=8, log_stats=False, depth_policy=None, record_trajectories=False,
+                 board_size=4):
         super().__init__()
+        if record_trajectories and board_size != 4:
+            raise ValueError('Trajectories can only be recorded for 4x4 games')
         self.verbose = verbose
         self.max_depth = max_depth
+        self.log_stats = log_stats
+        self.depth_policy = depth_policy
+        self.record_trajectories = record_trajectories
+        self.board_size = board_size
         self.result_path = 'results/minimax'
+        self.latency = LatencyHistogram()
+        self.phase_latency = {}
+        self._last_report = None
+
+    def save_move_stats(self, f, game_id, step, stats):
+        """Append the search stats of one move to the stats log, opened unbuffered in binary append mode
+
+        Every record is appended with a single write, so that records of games played in parallel processes
+        never interleave.
+        """
+        record = {'game': game_id, 'step': step}
+        record.update(stats.as_dict())
+        f.write((json.dumps(record) + '\n').encode())
+
+    def game_report(self):
+        """Return the info and the latency histograms of the last game played"""
+        return self._last_report
+
+    @staticmethod
+    def _append_rows(path, header, rows):
+        """Append rows to a CSV, writing the header first if the file is new"""
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='\n') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(header)
+            writer.writerows(rows)
+
+    def save_reports(self, reports):
+        """Add the latencies of finished games to the aggregates and save their percentiles
 
-    def test_one_game(self):
-        """Go through one game, played by a MinimaxAgent instance"""
+        One row per game is appended to '{result_path}_latency.csv'.
+        """
+        rows = []
+        for report in reports:
+            if report is None:
+                continue
+            info, latency, phases = report
+            self.latency.merge(latency)
+            for phase, histogram in phases.items():
+                self.phase_latency.setdefault(phase, LatencyHistogram()).merge(histogram)
+            summary = latency.summary()
+            rows.append(info[:3] + [summary[k] for k in self._summary_columns()])
+        if rows:
+            self._append_rows('{}_latency.csv'.format(self.result_path),
+                              ['score', 'best_tile', 'step'] + self._summary_columns(), rows)
+
+    @staticmethod
+    def _summary_columns():
+        """The columns of a latency summary"""
+        return ['count', 'mean'] + ['p{}'.format(p) for p in PERCENTILES] + ['max']
+
+    def finish_run(self):
+        """Save the aggregate latency percentiles, overall and by game phase
+
+        Rows are appended to '{result_path}_latency_summary.csv', tagged with the time of the run.
+        """
+        if not self.latency.count:
+            return
+        run = time.strftime('%Y-%m-%d %H:%M:%S')
+        rows = [[run, 'all', 'all'] + [self.latency.summary()[k] for k in self._summary_columns()]]
+        for (max_tile, empty_tiles), histogram in sorted(self.phase_latency.items()):
+            summary = histogram.summary()
+            rows.append([run, max_tile, empty_tiles] + [summary[k] for k in self._summary_columns()])
+        self._append_rows('{}_latency_summary.csv'.format(self.result_path),
+                          ['run', 'max_tile', 'empty_tiles'] + self._summary_columns(), rows)
+        summary = self.latency.summary()
+        print('get_move latency over {} moves: p50 {:.3f}s, p90 {:.3f}s, p99 {:.3f}s, max {:.3f}s'.format(
+            summary['count'], summary['p50'], summary['p90'], summary['p99'], summary['max']))
+
+    def test_one_game(self, save=True):
+        """Go through one game, played by a MinimaxAgent instance
+
+        Parameters
+        ----------
+        save : bool, optional (default=True)
+            If True, the game info is appended to the result CSV.
+            If False, it is only returned, e.g. for the caller to save results of many games at once.
+
+        Return
+        ----------
+        list
+            The game info, see `Game2048.game_info`.
+        """
+        latency = LatencyHistogram()
+        phases = {}
         game = self.create_one_game()
-        m = MinimaxAgent(max_depth=self.max_depth)
+        m = MinimaxAgent(max_depth=self.max_depth, stats=SearchStats() if self.log_stats else None,
+                         depth_policy=self.depth_policy)
+        stats_file = open('{}_stats.jsonl'.format(self.result_path), 'ab', buffering=0) if self.log_stats else None
+        game_id = uuid.uuid4().hex[:12]
+        trajectory = TrajectoryWriter('{}_trajectories'.format(self.result_path)) \
+            if self.record_trajectories else None
+        if trajectory is not None:
+            trajectory.start_game(game)
         entire_start = time.time()
         start = time.time()
         step = 0
-        while True:
-            step += 1
-            if step % 100 == 0:
-                end = time.time()
-                start, diff = end, end - start
-                self.show_game_status(game, diff, step)
-
-            if game.is_lost():
-                print('\n\nGame ended at step {}'.format(step))
-                game.print_game()
-                entire_end = time.time() - entire_start
-                game.save_game_info(step=step, time_cost=entire_end)
-                break
-
-            move = m.get_move(game)
-            game.perform_move(move)
-            game.perform_move(move)
+        try:
+            while True:
+                step += 1
+                if step % 100 == 0:
+                    end = time.time()
+                    start, diff = end, end - start
+                    self.show_game_status(game, diff, step)
+
+                if game.is_lost():
+                    print('\n\nGame ended at step {}'.format(step))
+                    game.print_game()
+                    entire_end = time.time() - entire_start
+                    info = game.game_info(step=step, time_cost=entire_end)
+                    self._last_report = (info, latency, phases)
+                    if trajectory is not None:
+                        trajectory.end_game(game)
+                    if save:
+                        game.save_game_info(step=step, time_cost=entire_end)
+                        self.save_reports([self._last_report])
+                    return info
+
+                phase = (max(max(row) for row in game.board), empty_tile_bucket(game.get_num_empty_tiles()))
+                move_start = time.time()
+                move = m.get_move(game)
+                move_latency = time.time() - move_start
+                latency.record(move_latency)
+                if phase not in phases:
+                    phases[phase] = LatencyHistogram()
+                phases[phase].record(move_latency)
+                if stats_file is not None:
+                    self.save_move_stats(stats_file, game_id, step, m.stats)
+                before = packed_board_of(game) if trajectory is not None else None
+                game.perform_move(move)
+                game.perform_move(move)
+                if trajectory is not None:
+                    trajectory.record_step(before, move, packed_board_of(game))
+        finally:
+            if stats_file is not None:
+                stats_file.close()
@@ -0,0 +1,34 @@
+"""Shared fixtures and helpers of the tests."""
+
+import os
+import random
+
+import pytest
+
+from game import Game2048
+from game.tables import CACHE_DIR_ENV
+
+
+@pytest.fixture(scope='session', autouse=True)
+def table_cache(tmp_path_factory):
+    """Build the table files in a temporary directory rather than in the user's cache"""
+    previous = os.environ.get(CACHE_DIR_ENV)
+    os.environ[CACHE_DIR_ENV] = str(tmp_path_factory.mktemp('tables'))
+    yield os.environ[CACHE_DIR_ENV]
+    if previous is None:
+        del os.environ[CACHE_DIR_ENV]
+    else:
+        os.environ[CACHE_DIR_ENV] = previous
+
+
+def seeded_boards(seed, size=4, count=40):
+    """Return boards of a seeded random game, from the opening to the end"""
+    game = Game2048(game_mode=False, seed=seed, size=size)
+    rng = random.Random(seed)
+    boards = []
+    while not game.is_lost() and len(boards) < count * 10:
+        move = rng.choice(game.moves_available())
+        game.perform_move(move)
+        game.perform_move(move)
+        boards.append([row[:] for row in game.board])
+    return boards[::max(1, len(boards) // count)]
@@ -0,0 +1,55 @@
+"""The bitboard backend must play exactly like the list backend it replaces."""
+
+import random
+
+import pytest
+
+from game import Bitboard2048, Game2048
+from game.bitboard import board_shape, legal_moves, pack_board, unpack_board
+
+SEEDS = range(20)
+
+
+def play_both(seed, size, max_moves=2000):
+    """Play the same seeded game on both backends, yielding both games after every move and spawn"""
+    games = [cls(game_mode=False, seed=seed, size=size) for cls in (Game2048, Bitboard2048)]
+    # The moves are drawn from a generator of their own, so that they do not consume the spawn draws
+    rng = random.Random(seed)
+    for _ in range(max_moves):
+        if games[0].is_lost():
+            break
+        move = rng.choice(games[0].moves_available())
+        for game in games:
+            game.perform_move(move)
+            game.perform_move(move)
+        yield games
+
+
+@pytest.mark.parametrize('size', [3, 4, 5, 6])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_seeded_games_match(seed, size):
+    moves = 0
+    for game, bitboard in play_both(seed, size):
+        assert bitboard.board == game.board
+        assert bitboard.score == game.score
+        assert bitboard.moves_available() == game.moves_available()
+        assert bitboard.is_lost() == game.is_lost()
+        moves += 1
+    assert moves > 0
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_moves_match_on_random_boards(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        board = [[rng.choice([0, 0, 2, 2, 4, 8, 16, 1024]) for _ in range(4)] for _ in range(4)]
+        packed = pack_board(board)
+        assert unpack_board(packed) == board
+        for move in range(4):
+            game = Game2048(game_mode=False)
+            game.board = [row[:] for row in board]
+            changed = game.perform_move(move)
+            moved, score = board_shape(4).execute_move(packed, move)
+            assert unpack_board(moved) == game.board
+            assert score == game.score
+            assert (move in legal_moves(packed)) == changed
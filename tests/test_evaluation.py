@@ -0,0 +1,37 @@
+"""The table-driven evaluation must score boards exactly like the heuristic functions of MinimaxAgent."""
+
+import random
+
+import pytest
+
+from agent import MinimaxAgent
+from agent.tuning import sample_config
+from game import Bitboard2048
+from tests.conftest import seeded_boards
+
+SEEDS = range(10)
+
+
+def check_agent(agent, seed, size=4, exact=False):
+    for board in seeded_boards(seed, size):
+        game = Bitboard2048(game_mode=False, size=size)
+        game.board = board
+        expected = agent.evaluate_heuristics(game)
+        # Float weights sum the terms in another order than the heuristic functions
+        assert agent.evaluate(game) == (expected if exact else pytest.approx(expected, rel=1e-12, abs=1e-9))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_default_weights(seed):
+    check_agent(MinimaxAgent(), seed, exact=True)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_tuned_weights(seed):
+    # Heuristic weights, weight matrix and max tile credit are all sampled
+    check_agent(MinimaxAgent(cache_tables=False, **sample_config(random.Random(seed))), seed)
+
+
+@pytest.mark.parametrize('size', [3, 5])
+def test_other_sizes(size):
+    check_agent(MinimaxAgent(), 0, size)
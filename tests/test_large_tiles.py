@@ -0,0 +1,24 @@
+"""Agents must keep playing once tiles outgrow the packed boards (beyond 32768)."""
+
+import pytest
+
+from agent import ExpectimaxAgent, MinimaxAgent
+from game import Game2048
+
+BOARD = [
+    [65536, 32768, 2, 4],
+    [2, 4, 8, 16],
+    [0, 0, 2, 0],
+    [0, 0, 0, 0],
+]
+
+
+@pytest.mark.parametrize('agent', [MinimaxAgent(max_depth=4), MinimaxAgent(max_depth=4, tt_size=1000),
+                                   ExpectimaxAgent(max_depth=3)], ids=['minimax', 'minimax-tt', 'expectimax'])
+def test_move_with_65536_tile(agent):
+    game = Game2048(game_mode=False, seed=0)
+    game.board = [row[:] for row in BOARD]
+    move = agent.get_move(game)
+    assert move in game.moves_available()
+    # The search works on copies
+    assert game.board == BOARD
@@ -0,0 +1,25 @@
+"""The root-parallel search must pick the moves of the serial search (without transposition table)."""
+
+import pytest
+
+from agent import MinimaxAgent
+from game import Bitboard2048
+from tests.conftest import seeded_boards
+
+SEEDS = range(4)
+
+
+@pytest.fixture(scope='module')
+def agents():
+    serial, parallel = MinimaxAgent(max_depth=6), MinimaxAgent(max_depth=6, workers=2)
+    yield serial, parallel
+    parallel.close()
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_same_moves(agents, seed):
+    serial, parallel = agents
+    for board in seeded_boards(seed, count=15):
+        game = Bitboard2048(game_mode=False)
+        game.board = board
+        assert parallel.get_move(game) == serial.get_move(game)